@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import io
+import sys
+import copy
+import yaml
+import tarfile
+import zipfile
+import threading
+import configparser
+import contextlib
+
+from pathlib import Path
+from collections import OrderedDict
+from reftool.note import Note
+from reftool.item import Item
+from reftool.cache import CacheFile
+from reftool.search import Search
+from reftool.reference import Reference
+from reftool.init import read_config, expand, split_list, default_config
+
+
+class ThreadOutput:
+    '''
+    The formatting library prints rendered blocks to sys.stdout. While at least one Archive
+    renders a reference, sys.stdout is replaced by a ThreadOutput object. Output of a rendering
+    thread is written to the buffer of that thread, output of all other threads is passed to the
+    stream that was installed before.
+    '''
+    lock = threading.Lock()
+    local = threading.local()
+    instance = None
+    users = 0
+
+    def __init__(self, stream) -> None:
+        '''
+        Creates a new ThreadOutput object that passes output to the specified stream.
+
+        Parameters:
+            stream                  Stream for the output of threads that do not render
+
+        Returns:
+            None
+        '''
+        self.stream = stream
+
+    def target(self):
+        '''
+        Returns the stream that output of the current thread is written to.
+
+        Parameters:
+            None
+
+        Returns:
+            stream                  Buffer of the current thread or the previous stream
+        '''
+        buffer = getattr(ThreadOutput.local, 'buffer', None)
+        return self.stream if buffer is None else buffer
+
+    def write(self, data: str) -> int:
+        return self.target().write(data)
+
+    def flush(self) -> None:
+        self.target().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.target(), name)
+
+    @contextlib.contextmanager
+    def capture():
+        '''
+        Context manager that captures everything that is printed by the current thread.
+
+        Parameters:
+            None
+
+        Returns:
+            buffer                  StringIO object containing the printed output
+        '''
+        with ThreadOutput.lock:
+
+            if sys.stdout is not ThreadOutput.instance:
+                ThreadOutput.instance = ThreadOutput(sys.stdout)
+                sys.stdout = ThreadOutput.instance
+
+            ThreadOutput.users += 1
+
+        ThreadOutput.local.buffer = io.StringIO()
+
+        try:
+            yield ThreadOutput.local.buffer
+
+        finally:
+            ThreadOutput.local.buffer = None
+
+            with ThreadOutput.lock:
+
+                ThreadOutput.users -= 1
+
+                if ThreadOutput.users == 0 and sys.stdout is ThreadOutput.instance:
+                    sys.stdout = ThreadOutput.instance.stream
+                    ThreadOutput.instance = None
+
+
+class Archive:
+    '''
+    An Archive object provides access to the references within a reference path without
+    relying on the global state that is set by reftool_init. Each Archive holds its own
+    configuration, returns data instead of printing it and keeps an LRU cache of parsed
+    references. Archive objects can be shared across threads.
+    '''
+    display_options = ['initial_indent', 'headline_size', 'headline_color', 'text_size', 'text_color',
+                       'count_color', 'count_padding', 'count_indent', 'comment_size', 'comment_color',
+                       'parameter_color']
+
+    parse_lock = threading.Lock()
+
+    def __init__(self, reference_path: Path, completer_path: Path = None, display: dict = None,
+                 cache_size: int = 64, ignore: list[str] = None, archive_order: list[str] = None,
+                 search_timeout: float = None) -> None:
+        '''
+        Creates a new Archive object for the specified reference path. Options that are not
+        specified are taken from the default reftool configuration.
+
+        Parameters:
+            reference_path          Path to the directory there the .yml files are stored
+            completer_path          Path to the directory there the completer scripts are stored
+            display                 Display options as found in the [Item] and [Note] config sections
+            cache_size              Maximum number of parsed references kept in memory
+            ignore                  List of glob patterns for directory names that are skipped
+            archive_order           Archive names that take precedence, in descending order
+            search_timeout          Time budget per file for regex searches in seconds
+
+        Returns:
+            None
+        '''
+        config_parser = configparser.ConfigParser()
+        config_parser.read(default_config)
+        reference_config = config_parser['Reference']
+
+        self.reference_path = Path(reference_path)
+        self.completer_path = Path(completer_path or reference_path)
+        self.display = Archive.display_from_config(config_parser)
+        self.display.update(display or {})
+        self.cache_size = cache_size
+
+        self.ignore = split_list(reference_config['ignore']) if ignore is None else ignore
+        self.archive_order = split_list(reference_config['archive_order']) if archive_order is None else archive_order
+        self.search_timeout = float(reference_config['search_timeout']) if search_timeout is None else search_timeout
+
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+
+    def display_from_config(config_parser) -> dict:
+        '''
+        Extracts the display options from a ConfigParser object.
+
+        Parameters:
+            config_parser           ConfigParser containing the reftool configuration
+
+        Returns:
+            display                 Dictionary of display options
+        '''
+        display = {}
+
+        for section in ['Reference', 'Item', 'Note']:
+
+            for option in Archive.display_options:
+
+                if config_parser.has_option(section, option):
+                    display[option] = config_parser[section][option]
+
+        for option, value in display.items():
+
+            if value.isdigit():
+                display[option] = int(value)
+
+        return display
+
+    def from_config(user_config: Path = None) -> Archive:
+        '''
+        Creates a new Archive object from a reftool configuration file.
+
+        Parameters:
+            user_config             Path to the configuration file (default: ~/.config/reftool.ini)
+
+        Returns:
+            Archive                 New created Archive object
+        '''
+        user_home = Path.home()
+        config_parser = read_config(user_config)
+
+        reference_config = config_parser['Reference']
+        reference_path = expand(reference_config['reference_path'], user_home)
+        completer_path = expand(reference_config['completer_path'], user_home)
+
+        return Archive(reference_path, completer_path, Archive.display_from_config(config_parser),
+                       ignore=split_list(reference_config['ignore']),
+                       archive_order=split_list(reference_config['archive_order']),
+                       search_timeout=float(reference_config['search_timeout']))
+
+    def get_references(self) -> list[Path]:
+        '''
+        Returns the paths of all references within the reference path of the archive. Bundles
+        that cannot be read are skipped.
+
+        Parameters:
+            None
+
+        Returns:
+            list                    List of Path objects, one for each reference
+        '''
+        return Reference.get_references(self.reference_path, self.ignore, self.archive_order, quiet=True)
+
+    def list(self, expression: str = '') -> list[str]:
+        '''
+        Returns the names of all references that start with the specified expression.
+
+        Parameters:
+            expression              Only references starting with expression are returned
+
+        Returns:
+            references              List of matching reference names
+        '''
+        references = map(lambda x: x.stem, self.get_references())
+        return list(filter(lambda x: x.startswith(expression), references))
+
+    def search(self, expression: str | list[str], match_all: bool = False, skipped: list[str] = None) -> list[str]:
+        '''
+        Returns the names of all references whose content matches the specified expression.
+        When a list of expressions is specified, each of them is treated as a literal search
+        term. Raises re.error for invalid expressions.
+
+        Parameters:
+            expression              Expression or list of terms to look for
+            match_all               Whether all terms need to match (default: any term)
+            skipped                 List where references that exceeded the time budget are appended to
+
+        Returns:
+            matches                 List of matching reference names
+        '''
+        if isinstance(expression, str):
+            expression = [expression]
+
+        skipped_paths = []
+        matches = Search.search(self.get_references(), expression, match_all, skipped_paths, self.search_timeout)
+
+        if skipped is not None:
+            skipped += map(lambda x: x.stem, skipped_paths)
+
+        return list(map(lambda x: x.stem, matches))
+
+    def load(self, name: str) -> Reference:
+        '''
+        Returns the Reference object for the specified name. Parsed references are cached
+        until their file changes. The returned object is a copy and can be modified freely.
+
+        Parameters:
+            name                    Name of the reference to load
+
+        Returns:
+            Reference               Reference object or None, if the reference cannot be loaded
+        '''
+        with self.lock:
+            entry = self.cache.get(name)
+
+        if entry is not None:
+
+            path, fingerprint, reference = entry
+
+            try:
+
+                if CacheFile.fingerprint(path) == fingerprint:
+
+                    with self.lock:
+
+                        if name in self.cache:
+                            self.cache.move_to_end(name)
+
+                    return copy.deepcopy(reference)
+
+            except OSError:
+                pass
+
+        path = Reference.find_reference(name, self.reference_path, self.ignore, self.archive_order, quiet=True)
+
+        if path is None:
+            return None
+
+        try:
+            fingerprint = CacheFile.fingerprint(path)
+
+            with path.open('r') as file:
+                yaml_data = yaml.safe_load(file)
+
+            with Archive.parse_lock:
+                Note.note_count = 1
+                reference = Reference(name, [Item.parse_item(item) for item in yaml_data['Items']])
+
+        except (OSError, KeyError, TypeError, yaml.YAMLError, zipfile.BadZipFile, tarfile.TarError):
+            return None
+
+        with self.lock:
+
+            self.cache[name] = (path, fingerprint, reference)
+            self.cache.move_to_end(name)
+
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return copy.deepcopy(reference)
+
+    def get_note(self, name: str, number: str) -> Note:
+        '''
+        Returns the note with the specified number from the specified reference.
+
+        Parameters:
+            name                    Name of the reference
+            number                  Number of the note
+
+        Returns:
+            Note                    Note object or None, if the note cannot be found
+        '''
+        reference = self.load(name)
+
+        if reference is None:
+            return None
+
+        for item in reference.items:
+
+            note = item.get_note(str(number))
+
+            if note is not None:
+                return note
+
+        return None
+
+    def render(self, name: str) -> str:
+        '''
+        Returns the formatted output of the specified reference, as it would be printed
+        by the ref command.
+
+        Parameters:
+            name                    Name of the reference
+
+        Returns:
+            output                  Rendered reference or None, if the reference cannot be loaded
+        '''
+        reference = self.load(name)
+
+        if reference is None:
+            return None
+
+        with ThreadOutput.capture() as buffer:
+            reference.print(self.display)
+
+        return buffer.getvalue()
+
+    def expand(self, name: str, number: str, arguments: list[str] | dict = None, encoding: str = None) -> str:
+        '''
+        Returns the text of the specified note with all parameters replaced by the specified
+        arguments and the selected encoding applied.
+
+        Parameters:
+            name                    Name of the reference
+            number                  Number of the note
+            arguments               List of key=value pairs or a dictionary
+            encoding                Encoding to apply after the replacement
+
+        Returns:
+            text                    Expanded note text or None, if the note cannot be found
+        '''
+        note = self.get_note(name, number)
+
+        if note is None:
+            return None
+
+        arguments = arguments or []
+
+        if isinstance(arguments, dict):
+            arguments = [f'{key}={value}' for key, value in arguments.items()]
+
+        return note.expand(arguments, encoding)
+
+    def complete(self, name: str, number: str, param: str = None) -> list[str] | dict[str, list[str]]:
+        '''
+        Returns the possible completions for a parameter of the specified note. Completers are
+        looked up within the completer path of the archive. If no parameter is specified, the
+        completions for all parameters of the note are returned.
+
+        Parameters:
+            name                    Name of the reference
+            number                  Number of the note
+            param                   Name of the parameter to complete
+
+        Returns:
+            completions             List of completions (dictionary of parameter name -> list
+                                    of completions, if no parameter was specified) or None, if
+                                    the note cannot be found
+        '''
+        note = self.get_note(name, number)
+
+        if note is None:
+            return None
+
+        if param is None:
+            return note.get_completions(self.completer_path)
+
+        return note.get_completion(param.lower(), self.completer_path)
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import io
+import os
+import hashlib
+import tarfile
+import zipfile
+import threading
+
+from pathlib import Path, PurePosixPath
+from reftool.cache import CacheFile
+
+
+class BundleEntry:
+    '''
+    A BundleEntry represents a single .yml file inside of a reference bundle. It provides the
+    subset of the Path interface that is used for reference files, so that references from
+    bundles can be used wherever references from the file system are used.
+    '''
+
+    def __init__(self, bundle: Path, member: str) -> None:
+        '''
+        Creates a new BundleEntry object.
+
+        Parameters:
+            bundle              Path of the bundle file
+            member              Name of the member inside the bundle
+
+        Returns:
+            None
+        '''
+        self.bundle = bundle
+        self.member = member
+
+        member_path = PurePosixPath(member)
+        self.name = member_path.name
+        self.stem = member_path.stem
+        self.suffix = member_path.suffix
+
+    def __str__(self) -> str:
+        return f'{self.bundle}/{self.member}'
+
+    def __repr__(self) -> str:
+        return f'BundleEntry({str(self)!r})'
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BundleEntry) and (self.bundle, self.member) == (other.bundle, other.member)
+
+    def __hash__(self) -> int:
+        return hash((self.bundle, self.member))
+
+    def __lt__(self, other) -> bool:
+        return str(self) < str(other)
+
+    def resolve(self) -> BundleEntry:
+        '''
+        Returns the entry with the path of the bundle being resolved.
+
+        Parameters:
+            None
+
+        Returns:
+            BundleEntry         Resolved entry
+        '''
+        return BundleEntry(self.bundle.resolve(), self.member)
+
+    def stat(self) -> os.stat_result:
+        '''
+        Returns the stat result of the bundle file. Each change of a member changes the
+        bundle as well, which makes this usable for change detection.
+
+        Parameters:
+            None
+
+        Returns:
+            stat_result         Stat result of the bundle file
+        '''
+        return self.bundle.stat()
+
+    def read_bytes(self) -> bytes:
+        '''
+        Returns the content of the entry.
+
+        Parameters:
+            None
+
+        Returns:
+            bytes               Content of the entry
+        '''
+        return Bundle.open(self.bundle).read(self.member)
+
+    def read_text(self) -> str:
+        '''
+        Returns the decoded content of the entry.
+
+        Parameters:
+            None
+
+        Returns:
+            str                 Content of the entry
+        '''
+        return self.read_bytes().decode('utf-8')
+
+    def open(self, mode: str = 'r'):
+        '''
+        Returns a file object for the content of the entry. Only reading is supported.
+
+        Parameters:
+            mode                Either 'r' or 'rb'
+
+        Returns:
+            file                File object for the entry content
+        '''
+        if mode == 'rb':
+            return io.BytesIO(self.read_bytes())
+
+        return io.StringIO(self.read_text())
+
+
+class Bundle:
+    '''
+    A Bundle is a .zip or .tar.gz archive containing reference files. The names of the .yml
+    members of each bundle are stored in an index on disk, which is rebuilt when the bundle
+    changes. Listing references or looking up a reference by name therefore does not need to
+    open the bundle at all. Only the indexes of the most recently used bundles are kept. Zip
+    bundles are accessed through their central directory, which allows to read a single member
+    without touching the rest of the bundle. Gzip compressed tar files cannot be accessed
+    randomly. Reading one of their members decompresses all .yml members in a single
+    sequential pass.
+    '''
+    suffixes = ['.zip', '.tar.gz', '.tgz']
+    index_path = None
+    max_entries = None
+
+    bundles = {}
+    lock = threading.Lock()
+
+    def __init__(self, path: Path) -> None:
+        '''
+        Creates a Bundle object and loads or builds the index of its .yml members.
+
+        Parameters:
+            path                Path of the bundle file
+
+        Returns:
+            None
+        '''
+        self.path = path
+        self.pid = os.getpid()
+        self.stat = path.stat()
+        self.zip = None
+        self.contents = None
+        self.lock = threading.Lock()
+
+        self.members = self.load_index()
+
+        if self.members is None:
+            self.members = self.build_index()
+            self.store_index()
+
+    def initialize(index_path: Path, max_entries: int) -> None:
+        '''
+        Sets the static attributes that are used by the Bundle class.
+
+        Parameters:
+            index_path          Directory where bundle indexes are stored (None disables storing)
+            max_entries         Maximum number of stored bundle indexes
+
+        Returns:
+            None
+        '''
+        Bundle.index_path = index_path
+        Bundle.max_entries = max_entries
+
+    def get_entry(self) -> Path:
+        '''
+        Returns the location of the index file for the bundle.
+
+        Parameters:
+            None
+
+        Returns:
+            entry               Path of the index file
+        '''
+        digest = hashlib.sha256(str(self.path.resolve()).encode('utf-8')).hexdigest()
+        return Bundle.index_path.joinpath(f'{digest}.json')
+
+    def load_index(self) -> dict[str, str]:
+        '''
+        Reads the member index of the bundle from disk, if it matches the fingerprint of
+        the bundle file.
+
+        Parameters:
+            None
+
+        Returns:
+            members             Dictionary of reference name -> member name or None
+        '''
+        if Bundle.index_path is None:
+            return None
+
+        index = CacheFile.read_json(self.get_entry())
+
+        try:
+
+            if index['fingerprint'] == CacheFile.fingerprint(self.path):
+                return index['members']
+
+        except (OSError, TypeError, KeyError):
+            pass
+
+        return None
+
+    def store_index(self) -> None:
+        '''
+        Writes the member index of the bundle to disk and evicts the least recently used
+        indexes, if there are too many of them.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        '''
+        if Bundle.index_path is None:
+            return
+
+        try:
+            index = {'fingerprint': CacheFile.fingerprint(self.path), 'members': self.members}
+
+        except OSError:
+            return
+
+        if CacheFile.write_json(self.get_entry(), index):
+            CacheFile.evict(Bundle.index_path, '.json', Bundle.max_entries)
+
+    def build_index(self) -> dict[str, str]:
+        '''
+        Builds the member index of the bundle. For zip bundles, only the central directory is
+        read. Tar bundles need to be decompressed completely, their .yml members are kept in
+        memory afterwards.
+
+        Parameters:
+            None
+
+        Returns:
+            members             Dictionary of reference name -> member name
+        '''
+        if self.is_zip():
+            members = [info.filename for info in self.open_zip().infolist() if not info.is_dir()]
+
+        else:
+            members = list(self.read_tar())
+
+        index = {}
+
+        for member in sorted(members):
+
+            member_path = PurePosixPath(member)
+
+            if member_path.suffix == '.yml' and not any(part.startswith('.') for part in member_path.parts):
+                index.setdefault(member_path.stem, member)
+
+        return index
+
+    def is_zip(self) -> bool:
+        '''
+        Checks whether the bundle is a zip file.
+
+        Parameters:
+            None
+
+        Returns:
+            bool                True for zip bundles
+        '''
+        return self.path.name.endswith('.zip')
+
+    def open_zip(self) -> zipfile.ZipFile:
+        '''
+        Opens a zip bundle. The ZipFile object is kept for the lifetime of the Bundle object.
+
+        Parameters:
+            None
+
+        Returns:
+            ZipFile             ZipFile object for the bundle
+        '''
+        if self.zip is None:
+            self.zip = zipfile.ZipFile(self.path)
+
+        return self.zip
+
+    def read_tar(self) -> dict[str, bytes]:
+        '''
+        Reads all .yml members of a tar bundle in a single sequential pass. The contents are
+        kept for the lifetime of the Bundle object.
+
+        Parameters:
+            None
+
+        Returns:
+            contents            Dictionary of member name -> member content
+        '''
+        if self.contents is None:
+
+            contents = {}
+
+            with tarfile.open(self.path, 'r:gz') as tar:
+
+                for info in tar:
+
+                    if info.isfile() and info.name.endswith('.yml'):
+                        contents[info.name] = tar.extractfile(info).read()
+
+            self.contents = contents
+
+        return self.contents
+
+    def is_bundle(path: Path) -> bool:
+        '''
+        Checks whether the specified path is a reference bundle.
+
+        Parameters:
+            path                Path to check
+
+        Returns:
+            bool                True if the path has a bundle suffix
+        '''
+        return any(path.name.endswith(suffix) for suffix in Bundle.suffixes)
+
+    def open(path: Path) -> Bundle:
+        '''
+        Returns the Bundle object for the specified path. Bundles are opened once per process
+        and reopened when the bundle file changes. Forked processes inherit the Bundle objects
+        of their parent, but need to open the bundle again, as the inherited file offsets are
+        shared with the parent and its other children.
+
+        Parameters:
+            path                Path of the bundle file
+
+        Returns:
+            Bundle              Bundle object for the path
+        '''
+        stat = path.stat()
+
+        with Bundle.lock:
+
+            bundle = Bundle.bundles.get(path)
+
+            if bundle is None or bundle.pid != os.getpid() or \
+               (bundle.stat.st_mtime_ns, bundle.stat.st_size) != (stat.st_mtime_ns, stat.st_size):
+                bundle = Bundle(path)
+                Bundle.bundles[path] = bundle
+
+        return bundle
+
+    def entries(self) -> list[BundleEntry]:
+        '''
+        Returns one BundleEntry for each reference within the bundle.
+
+        Parameters:
+            None
+
+        Returns:
+            list                List of BundleEntry objects
+        '''
+        return [BundleEntry(self.path, member) for member in self.members.values()]
+
+    def find(self, name: str) -> BundleEntry:
+        '''
+        Returns the entry for the reference with the specified name.
+
+        Parameters:
+            name                Name of the reference
+
+        Returns:
+            BundleEntry         Entry for the reference or None
+        '''
+        member = self.members.get(name)
+
+        if member is None:
+            return None
+
+        return BundleEntry(self.path, member)
+
+    def read(self, member: str) -> bytes:
+        '''
+        Returns the content of the specified member.
+
+        Parameters:
+            member              Name of the member
+
+        Returns:
+            bytes               Content of the member
+        '''
+        with self.lock:
+
+            if self.is_zip():
+                return self.open_zip().read(member)
+
+            return self.read_tar()[member]
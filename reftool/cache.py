@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import hashlib
+import reftool
+
+from pathlib import Path
+
+
+class CacheFile:
+    '''
+    The CacheFile class contains the file operations that are shared by the different caches
+    of reftool. Cache files are written atomically, so that concurrent processes never read
+    partially written entries. Directories of cache files are limited to a maximum number of
+    entries, the least recently used ones are removed first.
+    '''
+
+    def fingerprint(path: Path) -> str:
+        '''
+        Returns a string that changes whenever the specified file changes.
+
+        Parameters:
+            path                    Path of the file
+
+        Returns:
+            fingerprint             Fingerprint of the file
+        '''
+        stat = path.stat()
+        return f'{path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}'
+
+    def write(entry: Path, content: str) -> bool:
+        '''
+        Writes the specified content to a cache file. The content is written to a temporary
+        file first, which then replaces the cache file.
+
+        Parameters:
+            entry                   Path of the cache file
+            content                 Content to write
+
+        Returns:
+            bool                    True if the cache file was written
+        '''
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+
+            tmp = entry.with_name(f'{entry.name}.{os.getpid()}.tmp')
+            tmp.write_text(content)
+            os.replace(tmp, entry)
+
+            return True
+
+        except OSError:
+            return False
+
+    def write_json(entry: Path, data) -> bool:
+        '''
+        Writes the JSON representation of the specified data to a cache file.
+
+        Parameters:
+            entry                   Path of the cache file
+            data                    JSON serializable data
+
+        Returns:
+            bool                    True if the cache file was written
+        '''
+        return CacheFile.write(entry, json.dumps(data))
+
+    def read_json(entry: Path):
+        '''
+        Reads a JSON cache file and marks it as recently used.
+
+        Parameters:
+            entry                   Path of the cache file
+
+        Returns:
+            data                    Content of the cache file or None
+        '''
+        try:
+            data = json.loads(entry.read_text())
+            os.utime(entry)
+            return data
+
+        except (OSError, ValueError):
+            return None
+
+    def evict(directory: Path, suffix: str, max_entries: int) -> None:
+        '''
+        Removes the least recently used cache files with the specified suffix until the
+        directory contains at most max_entries of them.
+
+        Parameters:
+            directory               Directory containing the cache files
+            suffix                  Suffix of the cache files
+            max_entries             Maximum number of cache files to keep
+
+        Returns:
+            None
+        '''
+        entries = []
+
+        try:
+
+            for entry in os.scandir(directory):
+
+                if entry.name.endswith(suffix):
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+
+        except OSError:
+            return
+
+        entries.sort()
+
+        for _, entry in entries[:max(0, len(entries) - max_entries)]:
+
+            try:
+                os.unlink(entry)
+
+            except FileNotFoundError:
+                pass
+
+
+class RenderCache:
+    '''
+    The RenderCache class stores the fully rendered output of references on disk. Entries are
+    keyed by the fingerprint of the reference file, the current display configuration and the
+    terminal width. Displaying an unchanged reference is then a single read of the cache entry.
+    '''
+    cache_path = None
+    max_entries = None
+
+    def initialize(cache_path: Path, max_entries: int) -> None:
+        '''
+        Sets the static attributes that are used by the RenderCache class.
+
+        Parameters:
+            cache_path              Directory where rendered references are stored
+            max_entries             Maximum number of cached references (0 disables the cache)
+
+        Returns:
+            None
+        '''
+        RenderCache.cache_path = cache_path
+        RenderCache.max_entries = max_entries
+
+    def enabled() -> bool:
+        '''
+        Checks whether the render cache was initialized and is enabled.
+
+        Parameters:
+            None
+
+        Returns:
+            bool                    True if the cache can be used
+        '''
+        return RenderCache.cache_path is not None and RenderCache.max_entries > 0
+
+    def config_hash() -> str:
+        '''
+        Creates a hash over all configuration options that influence the rendered output
+        of a reference.
+
+        Parameters:
+            None
+
+        Returns:
+            hash                    Hex digest of the display configuration
+        '''
+        Item = reftool.item.Item
+        Note = reftool.note.Note
+        Reference = reftool.reference.Reference
+
+        options = [Reference.initial_indent, Item.headline_size, Item.headline_color, Note.text_size,
+                   Note.text_color, Note.count_color, Note.count_padding, Note.count_indent,
+                   Note.comment_size, Note.comment_color, Note.parameter_color]
+
+        return hashlib.sha256(repr(options).encode('utf-8')).hexdigest()
+
+    def get_entry(path: Path) -> Path:
+        '''
+        Returns the location of the cache entry for the specified reference file.
+
+        Parameters:
+            path                    Path of the reference file
+
+        Returns:
+            entry                   Path of the cache entry
+        '''
+        width = shutil.get_terminal_size().columns
+        key = f'{CacheFile.fingerprint(path)}:{RenderCache.config_hash()}:{width}'
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+        return RenderCache.cache_path.joinpath(f'{digest}.ansi')
+
+    def load(path: Path) -> str:
+        '''
+        Returns the cached output for the specified reference file or None, if no
+        matching entry exists.
+
+        Parameters:
+            path                    Path of the reference file
+
+        Returns:
+            output                  Rendered output or None
+        '''
+        if not RenderCache.enabled():
+            return None
+
+        try:
+            entry = RenderCache.get_entry(path)
+            output = entry.read_text()
+            os.utime(entry)
+            return output
+
+        except OSError:
+            return None
+
+    def store(path: Path, output: str) -> None:
+        '''
+        Stores the rendered output for the specified reference file and evicts the
+        least recently used entries, if the cache grows too large.
+
+        Parameters:
+            path                    Path of the reference file
+            output                  Rendered output of the reference
+
+        Returns:
+            None
+        '''
+        if not RenderCache.enabled():
+            return
+
+        try:
+            entry = RenderCache.get_entry(path)
+
+        except OSError:
+            return
+
+        if CacheFile.write(entry, output):
+            CacheFile.evict(RenderCache.cache_path, '.ansi', RenderCache.max_entries)
+
+
+class QueryCache:
+    '''
+    The QueryCache class stores the results of searches on disk. Entries are keyed by the search
+    terms, the search mode and the generation of the reference path. The generation is derived
+    from the location, modification time and size of all reference files and bundles, so that
+    each change within the reference path invalidates all cached results.
+    '''
+    cache_file = None
+    max_entries = None
+
+    def initialize(cache_file: Path, max_entries: int) -> None:
+        '''
+        Sets the static attributes that are used by the QueryCache class.
+
+        Parameters:
+            cache_file              File where the query results are stored
+            max_entries             Maximum number of cached queries (0 disables the cache)
+
+        Returns:
+            None
+        '''
+        QueryCache.cache_file = cache_file
+        QueryCache.max_entries = max_entries
+
+    def enabled() -> bool:
+        '''
+        Checks whether the query cache was initialized and is enabled.
+
+        Parameters:
+            None
+
+        Returns:
+            bool                    True if the cache can be used
+        '''
+        return QueryCache.cache_file is not None and QueryCache.max_entries > 0
+
+    def get_generation(paths: list[Path]) -> str:
+        '''
+        Returns the generation of the specified references. References contained in bundles
+        change together with their bundle.
+
+        Parameters:
+            paths                   List of reference paths, as returned by Reference.get_references
+
+        Returns:
+            generation              Hex digest over all reference files and bundles
+        '''
+        digest = hashlib.sha256()
+
+        for path in paths:
+
+            try:
+                stat = path.stat()
+                digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode('utf-8'))
+
+            except OSError:
+                pass
+
+        return digest.hexdigest()
+
+    def get_key(mode: str, terms: list[str]) -> str:
+        '''
+        Returns the cache key for a query.
+
+        Parameters:
+            mode                    Search mode of the query
+            terms                   Search terms of the query
+
+        Returns:
+            key                     Cache key for the query
+        '''
+        return hashlib.sha256(json.dumps([mode, terms]).encode('utf-8')).hexdigest()
+
+    def read() -> dict:
+        '''
+        Reads all cached queries from disk.
+
+        Parameters:
+            None
+
+        Returns:
+            entries                 Dictionary of cache key -> entry, least recently used first
+        '''
+        entries = CacheFile.read_json(QueryCache.cache_file)
+        return entries if isinstance(entries, dict) else {}
+
+    def write(entries: dict, generation: str) -> None:
+        '''
+        Writes the cached queries to disk. Entries from other generations and the least recently
+        used entries that exceed max_entries are dropped.
+
+        Parameters:
+            entries                 Dictionary of cache key -> entry, least recently used first
+            generation              Current generation of the reference path
+
+        Returns:
+            None
+        '''
+        entries = {key: entry for key, entry in entries.items() if entry.get('generation') == generation}
+        entries = dict(list(entries.items())[-QueryCache.max_entries:])
+
+        CacheFile.write_json(QueryCache.cache_file, entries)
+
+    def load(mode: str, terms: list[str], paths: list[Path]):
+        '''
+        Returns the cached result of a query or None, if no result for the current generation
+        of the reference path exists.
+
+        Parameters:
+            mode                    Search mode of the query
+            terms                   Search terms of the query
+            paths                   List of all reference paths
+
+        Returns:
+            result                  Cached result or None
+        '''
+        if not QueryCache.enabled():
+            return None
+
+        entries = QueryCache.read()
+        key = QueryCache.get_key(mode, terms)
+        entry = entries.pop(key, None)
+        generation = QueryCache.get_generation(paths)
+
+        if entry is None or entry.get('generation') != generation:
+            return None
+
+        entries[key] = entry
+        QueryCache.write(entries, generation)
+
+        return entry['result']
+
+    def store(mode: str, terms: list[str], result, paths: list[Path]) -> None:
+        '''
+        Stores the result of a query.
+
+        Parameters:
+            mode                    Search mode of the query
+            terms                   Search terms of the query
+            result                  JSON serializable result of the query
+            paths                   List of all reference paths
+
+        Returns:
+            None
+        '''
+        if not QueryCache.enabled():
+            return
+
+        entries = QueryCache.read()
+        key = QueryCache.get_key(mode, terms)
+
+        generation = QueryCache.get_generation(paths)
+
+        entries.pop(key, None)
+        entries[key] = {'generation': generation, 'result': result}
+
+        QueryCache.write(entries, generation)
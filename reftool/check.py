@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import os
+import time
+import yaml
+import tarfile
+import zipfile
+
+from pathlib import Path
+from reftool.note import Note
+from reftool.item import Item
+from reftool.reference import Reference
+from reftool.completer import CompleterRegistry
+from ttf import coloredWrapper
+from concurrent.futures import ProcessPoolExecutor
+
+
+class CheckResult:
+    '''
+    A CheckResult contains the outcome of validating a single reference file.
+    '''
+
+    def __init__(self, path: Path) -> None:
+        '''
+        Creates a new CheckResult object for the specified reference file.
+
+        Parameters:
+            path                    Path of the validated reference file
+
+        Returns:
+            None
+        '''
+        self.path = str(path)
+        self.name = path.stem
+        self.size = 0
+        self.parse_time = 0.0
+        self.errors = []
+
+    def error(self, location: str, message: str) -> None:
+        '''
+        Adds an error message for the specified location to the result.
+
+        Parameters:
+            location                Location of the error within the reference
+            message                 Description of the error
+
+        Returns:
+            None
+        '''
+        self.errors.append(f'{location}: {message}')
+
+
+class Check:
+    '''
+    The Check class validates all references within the reference path. Validation is
+    performed in parallel, one reference file per task.
+    '''
+    autocomplete_types = ['list', 'IP', 'script', 'python']
+
+    def check_reference(path: Path, completer_path: str, completer_folders: list[str]) -> CheckResult:
+        '''
+        Validates a single reference file. This function runs inside of a worker process
+        and therefore only uses picklable arguments and return values.
+
+        Parameters:
+            path                    Path of the reference file
+            completer_path          Path to the directory there the completer scripts are stored
+            completer_folders       List of completers folders within the completer path
+
+        Returns:
+            result                  CheckResult for the reference file
+        '''
+        result = CheckResult(path)
+
+        try:
+            content = path.read_bytes()
+            result.size = len(content)
+
+            start = time.perf_counter()
+            yaml_data = yaml.safe_load(content)
+            result.parse_time = time.perf_counter() - start
+
+        except (OSError, KeyError, yaml.YAMLError, zipfile.BadZipFile, tarfile.TarError) as e:
+            result.error('file', f'unable to parse reference ({type(e).__name__})')
+            return result
+
+        if not isinstance(yaml_data, dict) or not isinstance(yaml_data.get('Items'), list):
+            result.error('file', 'missing Items section')
+            return result
+
+        for ctr, item in enumerate(yaml_data['Items']):
+
+            location = f'Item {ctr}'
+
+            if not isinstance(item, dict):
+                result.error(location, 'item is not a mapping')
+                continue
+
+            if 'Name' not in item:
+                result.error(location, 'missing Name section')
+
+            else:
+                location = f'Item {ctr} ({item["Name"]})'
+
+            if not isinstance(item.get('Notes'), list):
+                result.error(location, 'missing Notes section')
+                continue
+
+            for note_ctr, note in enumerate(item['Notes']):
+                Check.check_note(result, f'{location}, Note {note_ctr}', note, completer_path, completer_folders)
+
+        return result
+
+    def check_note(result: CheckResult, location: str, note: dict, completer_path: str,
+                   completer_folders: list[str]) -> None:
+        '''
+        Validates a single note and adds all found errors to the result.
+
+        Parameters:
+            result                  CheckResult to add errors to
+            location                Location of the note within the reference
+            note                    Dictionary representation of the note
+            completer_path          Path to the directory there the completer scripts are stored
+            completer_folders       List of completers folders within the completer path
+
+        Returns:
+            None
+        '''
+        if not isinstance(note, dict):
+            result.error(location, 'note is not a mapping')
+            return
+
+        for key in ['Text', 'Comment']:
+
+            if key not in note:
+                result.error(location, f'missing {key} section')
+
+        text = str(note.get('Text', ''))
+
+        Check.check_lines(result, location, text, note.get('Lines'))
+        Check.check_autocomplete(result, location, text, note.get('Autocomplete'), completer_path,
+                                 completer_folders)
+
+    def check_lines(result: CheckResult, location: str, text: str, lines: list[int]) -> None:
+        '''
+        Validates that the Lines section of a note is a list of valid line indices.
+
+        Parameters:
+            result                  CheckResult to add errors to
+            location                Location of the note within the reference
+            text                    Text of the note
+            lines                   Content of the Lines section (or None)
+
+        Returns:
+            None
+        '''
+        if lines is None:
+            return
+
+        line_count = len(text.split('\n'))
+
+        if not isinstance(lines, list):
+            result.error(location, 'Lines is not a list')
+            return
+
+        for index in lines:
+
+            if not isinstance(index, int) or not -line_count <= index < line_count:
+                result.error(location, f'invalid line index {index!r} (note has {line_count} lines)')
+
+    def check_autocomplete(result: CheckResult, location: str, text: str, autocomplete: dict, completer_path: str,
+                           completer_folders: list[str]) -> None:
+        '''
+        Validates the Autocomplete section of a note.
+
+        Parameters:
+            result                  CheckResult to add errors to
+            location                Location of the note within the reference
+            text                    Text of the note
+            autocomplete            Content of the Autocomplete section (or None)
+            completer_path          Path to the directory there the completer scripts are stored
+            completer_folders       List of completers folders within the completer path
+
+        Returns:
+            None
+        '''
+        if autocomplete is None:
+            return
+
+        if not isinstance(autocomplete, dict):
+            result.error(location, 'Autocomplete is not a mapping')
+            return
+
+        params = set(Note.highlight.findall(text))
+
+        for param, comp in autocomplete.items():
+
+            param_location = f'{location}, Autocomplete {param}'
+
+            if str(param).upper() not in params:
+                result.error(param_location, 'parameter does not appear in Text')
+
+            if not isinstance(comp, dict) or comp.get('type') not in Check.autocomplete_types:
+                result.error(param_location, f'type needs to be one of {", ".join(Check.autocomplete_types)}')
+                continue
+
+            if comp['type'] == 'list' and not isinstance(comp.get('completer'), list):
+                result.error(param_location, 'list completer needs to be a list')
+
+            elif comp['type'] in ['script', 'python']:
+                Check.check_script(result, param_location, comp['type'], comp.get('completer'), completer_path,
+                                   completer_folders)
+
+    def check_script(result: CheckResult, location: str, kind: str, completer: str, completer_path: str,
+                     completer_folders: list[str]) -> None:
+        '''
+        Validates that a script completer exists and is executable or that a Python completer
+        exists. Completers are looked up in the same way as when they are run.
+
+        Parameters:
+            result                  CheckResult to add errors to
+            location                Location of the completer within the reference
+            kind                    Type of the completer (script or python)
+            completer               Completer specification
+            completer_path          Path to the directory there the completer scripts are stored
+            completer_folders       List of completers folders within the completer path
+
+        Returns:
+            None
+        '''
+        suffix = '.sh' if kind == 'script' else '.py'
+        script = completer.partition(':')[0] if isinstance(completer, str) and kind == 'python' else completer
+
+        if not isinstance(script, str) or not script.endswith(suffix):
+            result.error(location, f'{kind} completer needs to be a {suffix} file')
+            return
+
+        if CompleterRegistry.lookup(script, completer_folders, completer_path, kind == 'script') is not None:
+            return
+
+        if kind == 'script' and CompleterRegistry.lookup(script, completer_folders, completer_path) is not None:
+            result.error(location, f'completer {script} is not executable')
+            return
+
+        result.error(location, f'completer {script} not found within the completer path')
+
+    def find_duplicates(results: list[CheckResult]) -> dict[str, list[str]]:
+        '''
+        Finds references that share the same name across the reference path. The paths of each
+        name are returned in order of precedence, the first one is used when the name is looked up.
+
+        Parameters:
+            results                 List of CheckResult objects in order of precedence
+
+        Returns:
+            duplicates              Dictionary of reference name -> list of paths
+        '''
+        paths = {}
+
+        for result in results:
+            paths.setdefault(result.name, []).append(result.path)
+
+        return {name: path_list for name, path_list in paths.items() if len(path_list) > 1}
+
+    def run(workers: int = None) -> list[CheckResult]:
+        '''
+        Validates all references within the reference path in parallel.
+
+        Parameters:
+            workers                 Number of worker processes (default: number of cores)
+
+        Returns:
+            results                 List of CheckResult objects
+        '''
+        paths = Reference.get_references()
+        completer_path = str(CompleterRegistry.completer_path)
+        completer_folders = list(map(str, CompleterRegistry.get_folders()))
+
+        if not paths:
+            return []
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))
+            results = executor.map(Check.check_reference, paths, [completer_path] * len(paths),
+                                   [completer_folders] * len(paths), chunksize=chunksize)
+            return list(results)
+
+    def print_report(results: list[CheckResult]) -> bool:
+        '''
+        Prints the results of a check run, including the parse time and size of each
+        reference file. References are ordered by their parse time. Reference names that
+        are used by multiple files are reported as warnings, as the archive precedence
+        decides which of them is used.
+
+        Parameters:
+            results                 List of CheckResult objects
+
+        Returns:
+            bool                    True if no errors were found
+        '''
+        prefix = coloredWrapper('[+] ', Note.text_color)
+        duplicates = Check.find_duplicates(results)
+        valid = True
+
+        print(f'{prefix}{coloredWrapper("Parse time and size per reference:", Item.headline_color)}')
+
+        for result in sorted(results, key=lambda x: x.parse_time, reverse=True):
+
+            stats = coloredWrapper(f'{result.parse_time * 1000:8.2f} ms {result.size:10d} B', Note.count_color)
+            print(f'{prefix}  {stats}  {result.path}')
+
+        for result in results:
+
+            for error in result.errors:
+                print(f'[-] Error: {result.path}: {error}')
+                valid = False
+
+        for name, paths in duplicates.items():
+            print(f'[-] Warning: Reference name {name} is used by multiple files, {paths[0]} takes precedence over '
+                  f'{", ".join(paths[1:])}')
+
+        error_count = sum(map(lambda x: len(x.errors), results))
+        total = sum(map(lambda x: x.parse_time, results))
+        print(f'{prefix}Checked {len(results)} references in {total * 1000:.2f} ms parse time, found {error_count} errors '
+              f'and {len(duplicates)} warnings.')
+
+        return valid
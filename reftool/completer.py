@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import signal
+import selectors
+import threading
+import subprocess
+import importlib.util
+
+from pathlib import Path
+from typing import Callable
+from reftool.cache import CacheFile
+from reftool.discovery import Discovery
+
+
+class CompleterRegistry:
+    '''
+    The CompleterRegistry keeps track of the completers folders within the completer path.
+    The folders are looked up once and the result is stored on disk, so that completions do
+    not need to search the completer path recursively. The registry also loads Python
+    completers, which are executed in-process instead of forking a shell script.
+    '''
+    completer_path = None
+    registry_path = None
+
+    folders = None
+    path_folders = {}
+    functions = {}
+    lock = threading.Lock()
+
+    def initialize(completer_path: Path, registry_path: Path = None) -> None:
+        '''
+        Sets the static attributes that are used by the CompleterRegistry class.
+
+        Parameters:
+            completer_path          Path to the directory there the completer scripts are stored
+            registry_path           File where the completers folders are stored (None disables storing)
+
+        Returns:
+            None
+        '''
+        CompleterRegistry.completer_path = completer_path
+        CompleterRegistry.registry_path = registry_path
+        CompleterRegistry.folders = None
+        CompleterRegistry.path_folders = {}
+        CompleterRegistry.functions = {}
+
+    def scan() -> list[Path]:
+        '''
+        Searches the completer path for completers folders and stores the result in the
+        registry file.
+
+        Parameters:
+            None
+
+        Returns:
+            folders                 List of completers folders
+        '''
+        folders = Discovery.find_dirs(CompleterRegistry.completer_path, 'completers')
+
+        if CompleterRegistry.registry_path is not None:
+
+            registry = {
+                'completer_path': str(CompleterRegistry.completer_path),
+                'mtime': CompleterRegistry.completer_path.stat().st_mtime_ns,
+                'folders': list(map(str, folders)),
+            }
+
+            CacheFile.write_json(CompleterRegistry.registry_path, registry)
+
+        return folders
+
+    def load() -> list[Path]:
+        '''
+        Reads the completers folders from the registry file. The registry is only used if the
+        completer path was not modified since it was created and all folders still exist.
+
+        Parameters:
+            None
+
+        Returns:
+            folders                 List of completers folders or None
+        '''
+        if CompleterRegistry.registry_path is None:
+            return None
+
+        try:
+            registry = json.loads(CompleterRegistry.registry_path.read_text())
+
+            if registry['completer_path'] != str(CompleterRegistry.completer_path):
+                return None
+
+            if registry['mtime'] != CompleterRegistry.completer_path.stat().st_mtime_ns:
+                return None
+
+            folders = list(map(Path, registry['folders']))
+
+            if all(map(lambda x: x.is_dir(), folders)):
+                return folders
+
+        except (OSError, ValueError, KeyError):
+            pass
+
+        return None
+
+    def get_folders(rescan: bool = False, completer_path: Path = None) -> list[Path]:
+        '''
+        Returns the completers folders within the completer path. Folders of completer paths
+        other than the configured one are only kept in memory.
+
+        Parameters:
+            rescan                  Search the completer path again, even if the registry is valid
+            completer_path          Completer path to use instead of the configured one
+
+        Returns:
+            folders                 List of completers folders
+        '''
+        with CompleterRegistry.lock:
+
+            if completer_path is not None and completer_path != CompleterRegistry.completer_path:
+
+                if rescan or completer_path not in CompleterRegistry.path_folders:
+                    CompleterRegistry.path_folders[completer_path] = Discovery.find_dirs(completer_path, 'completers')
+
+                return CompleterRegistry.path_folders[completer_path]
+
+            if rescan:
+                CompleterRegistry.folders = CompleterRegistry.scan()
+
+            elif CompleterRegistry.folders is None:
+                CompleterRegistry.folders = CompleterRegistry.load() or CompleterRegistry.scan()
+
+            return CompleterRegistry.folders
+
+    def lookup(name: str, folders: list[Path], completer_path: Path, executable: bool = False) -> Path:
+        '''
+        Returns the path of the completer with the specified name within the specified folders.
+        Completers that resolve to a location outside of the completer path are ignored.
+
+        Parameters:
+            name                    Name of the completer file
+            folders                 List of completers folders to look in
+            completer_path          Path to the directory there the completer scripts are stored
+            executable              Whether the completer needs to be executable
+
+        Returns:
+            path                    Path of the completer or None
+        '''
+        completer_path = Path(completer_path).resolve()
+
+        for folder in folders:
+
+            path = Path(folder).joinpath(name).resolve()
+
+            if not path.is_file() or completer_path not in path.parents:
+                continue
+
+            if executable and not os.access(path, os.X_OK):
+                continue
+
+            return path
+
+        return None
+
+    def find(name: str, executable: bool = False, completer_path: Path = None) -> Path:
+        '''
+        Returns the path of the completer with the specified name. Completers need to be located
+        within the completer path. If the completer cannot be found in the known folders, the
+        completer path is searched once again.
+
+        Parameters:
+            name                    Name of the completer file
+            executable              Whether the completer needs to be executable
+            completer_path          Completer path to use instead of the configured one
+
+        Returns:
+            path                    Path of the completer or None
+        '''
+        completer_path = completer_path or CompleterRegistry.completer_path
+
+        for rescan in [False, True]:
+
+            path = CompleterRegistry.lookup(name, CompleterRegistry.get_folders(rescan, completer_path),
+                                            completer_path, executable)
+
+            if path is not None:
+                return path
+
+        return None
+
+    def load_function(completer: str, completer_path: Path = None):
+        '''
+        Loads a Python completer. The completer is specified as file name, optionally followed
+        by the name of the function to use (e.g. users.py:complete_users). The function defaults
+        to complete and is called with the name of the parameter to complete. Loaded functions
+        are cached for the lifetime of the process.
+
+        Parameters:
+            completer               Completer specification
+            completer_path          Completer path to use instead of the configured one
+
+        Returns:
+            function                Completer function or None
+        '''
+        name, _, function = completer.partition(':')
+        key = (str(completer_path or CompleterRegistry.completer_path), completer)
+
+        if not name.endswith('.py'):
+            return None
+
+        with CompleterRegistry.lock:
+
+            if key in CompleterRegistry.functions:
+                return CompleterRegistry.functions[key]
+
+        path = CompleterRegistry.find(name, completer_path=completer_path)
+
+        if path is None:
+            return None
+
+        module_name = 'reftool_completer_' + hashlib.sha256(str(path).encode('utf-8')).hexdigest()[:16]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+
+        spec.loader.exec_module(module)
+        function = getattr(module, function or 'complete', None)
+
+        if not callable(function):
+            function = None
+
+        with CompleterRegistry.lock:
+            CompleterRegistry.functions[key] = function
+
+        return function
+
+
+class CompleterExecutor:
+    '''
+    The CompleterExecutor runs completers concurrently and enforces a time budget and an output
+    limit on them. Each completer runs in its own daemon thread, so that a hanging completer
+    cannot block the shell or keep the process alive. Completers that exceed their budget or
+    fail are answered with the default completion.
+    '''
+    timeout = 2.0
+    max_output = 65536
+    default = ['[FILE]']
+
+    processes = set()
+    lock = threading.Lock()
+
+    def initialize(timeout: float, max_output: int) -> None:
+        '''
+        Sets the static attributes that are used by the CompleterExecutor class.
+
+        Parameters:
+            timeout                 Time budget for a completer in seconds
+            max_output              Maximum number of bytes accepted from a completer
+
+        Returns:
+            None
+        '''
+        CompleterExecutor.timeout = timeout
+        CompleterExecutor.max_output = max_output
+
+    def limit(completions: list[str]) -> list[str]:
+        '''
+        Truncates a list of completions to the configured output limit.
+
+        Parameters:
+            completions             List of completions
+
+        Returns:
+            completions             Truncated list of completions
+        '''
+        limited = []
+        size = 0
+
+        for completion in completions:
+
+            completion = str(completion)
+            size += len(completion.encode('utf-8')) + 1
+
+            if size > CompleterExecutor.max_output:
+                break
+
+            limited.append(completion)
+
+        return limited
+
+    def run_script(name: str, completer_path: Path = None) -> list[str]:
+        '''
+        Runs a script completer and returns its output lines. The output is read until the
+        script exits, the output limit is reached or the time budget is exceeded. The script
+        is killed afterwards.
+
+        Parameters:
+            name                    Name of the completer script
+            completer_path          Completer path to use instead of the configured one
+
+        Returns:
+            completions             List of completions or None
+        '''
+        script = CompleterRegistry.find(name, True, completer_path)
+
+        if script is None:
+            return None
+
+        process = subprocess.Popen([script], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + CompleterExecutor.timeout
+        output = b''
+
+        with CompleterExecutor.lock:
+            CompleterExecutor.processes.add(process)
+
+        try:
+
+            with selectors.DefaultSelector() as selector:
+
+                selector.register(process.stdout, selectors.EVENT_READ)
+
+                while len(output) <= CompleterExecutor.max_output:
+
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        return None
+
+                    if not selector.select(remaining):
+                        continue
+
+                    chunk = os.read(process.stdout.fileno(), 65536)
+
+                    if not chunk:
+                        break
+
+                    output += chunk
+
+        finally:
+            CompleterExecutor.kill(process)
+            process.stdout.close()
+
+        if len(output) > CompleterExecutor.max_output:
+            output = output[:CompleterExecutor.max_output].rsplit(b'\n', 1)[0]
+
+        output = output.decode('utf-8', errors='replace')
+        return list(filter(None, output.split('\n')))
+
+    def kill(process: subprocess.Popen) -> None:
+        '''
+        Kills a completer script including all processes that were started by it.
+
+        Parameters:
+            process                 Process of the completer script
+
+        Returns:
+            None
+        '''
+        with CompleterExecutor.lock:
+            CompleterExecutor.processes.discard(process)
+
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+
+        except OSError:
+            pass
+
+        process.wait()
+
+    def run_python(completer: str, param: str, completer_path: Path = None) -> list[str]:
+        '''
+        Runs a Python completer and returns its result. A string result is treated as a single
+        completion. Results that are neither a string nor a list (or tuple) are treated as failure.
+
+        Parameters:
+            completer               Completer specification (file name and optional function)
+            param                   Name of the parameter to complete
+            completer_path          Completer path to use instead of the configured one
+
+        Returns:
+            completions             List of completions or None
+        '''
+        function = CompleterRegistry.load_function(completer, completer_path)
+
+        if function is None:
+            return None
+
+        result = function(param)
+
+        if isinstance(result, str):
+            return [result]
+
+        if isinstance(result, (list, tuple)):
+            return list(result)
+
+        return None
+
+    def complete(completers: dict[str, Callable]) -> dict[str, list[str]]:
+        '''
+        Runs the specified completers concurrently. Each completer is a callable without arguments
+        that returns a list of completions. Completers that do not finish within the time budget,
+        that fail or that return None are answered with the default completion.
+
+        Parameters:
+            completers              Dictionary of parameter name -> completer
+
+        Returns:
+            completions             Dictionary of parameter name -> list of completions
+        '''
+        results = {}
+        threads = {}
+
+        def run(param: str, completer: Callable) -> None:
+
+            try:
+                results[param] = completer()
+
+            except Exception:
+                results[param] = None
+
+        for param, completer in completers.items():
+
+            threads[param] = threading.Thread(target=run, args=(param, completer), daemon=True)
+            threads[param].start()
+
+        deadline = time.monotonic() + CompleterExecutor.timeout
+        completions = {}
+
+        for param, thread in threads.items():
+
+            thread.join(max(0, deadline - time.monotonic()))
+            result = results.get(param) if not thread.is_alive() else None
+
+            if result is None:
+                completions[param] = CompleterExecutor.default
+
+            else:
+                completions[param] = CompleterExecutor.limit(result)
+
+        with CompleterExecutor.lock:
+            processes = list(CompleterExecutor.processes)
+
+        for process in processes:
+            CompleterExecutor.kill(process)
+
+        return completions
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import os
+import fnmatch
+
+from pathlib import Path, PurePosixPath
+from typing import Iterator
+from reftool.bundle import Bundle
+
+
+class Discovery:
+    '''
+    The Discovery class locates reference files and bundles within the reference path. The
+    reference path is walked with os.scandir and directories that match the ignore list are
+    never entered, so that VCS object stores or completer folders do not add to the cost of
+    discovery. Each top level entry of the reference path is treated as one archive. Archives
+    are walked in a deterministic order, which decides which reference wins on name collisions.
+    '''
+    ignore = ['.*', 'completers']
+    archive_order = []
+    manifest = '.reftool-manifest'
+
+    def initialize(ignore: list[str], archive_order: list[str]) -> None:
+        '''
+        Sets the static attributes that are used by the Discovery class.
+
+        Parameters:
+            ignore                  List of glob patterns for directory names that are skipped
+            archive_order           Archive names that take precedence, in descending order
+
+        Returns:
+            None
+        '''
+        Discovery.ignore = ignore
+        Discovery.archive_order = archive_order
+
+    def is_ignored(name: str, ignore: list[str]) -> bool:
+        '''
+        Checks whether a directory name matches one of the ignore patterns.
+
+        Parameters:
+            name                    Name of the directory
+            ignore                  List of glob patterns
+
+        Returns:
+            bool                    True if the directory should be skipped
+        '''
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in ignore)
+
+    def precedence(name: str, archive_order: list[str]) -> tuple[int, str]:
+        '''
+        Returns the sort key of an archive. Archives listed in archive_order come first, all
+        others follow in alphabetical order.
+
+        Parameters:
+            name                    Name of the archive
+            archive_order           Archive names that take precedence, in descending order
+
+        Returns:
+            tuple                   Sort key for the archive
+        '''
+        if name in archive_order:
+            return (archive_order.index(name), name)
+
+        return (len(archive_order), name)
+
+    def read_manifest(path: Path) -> list[tuple[str]]:
+        '''
+        Reads the manifest file of a directory. A manifest contains one glob pattern per line
+        relative to its directory. Only matching paths are searched for references. Empty
+        lines and lines starting with # are ignored, as well as absolute patterns and patterns
+        containing .. segments, as they could select paths outside of the archive.
+
+        Parameters:
+            path                    Path of the manifest file
+
+        Returns:
+            patterns                List of glob patterns, split into their path segments
+        '''
+        patterns = []
+
+        for line in path.read_text().splitlines():
+
+            line = line.strip()
+
+            if not line or line.startswith('#'):
+                continue
+
+            pattern = PurePosixPath(line)
+
+            if pattern.is_absolute() or '..' in pattern.parts or not pattern.parts:
+                continue
+
+            patterns.append(pattern.parts)
+
+        return patterns
+
+    def match_pattern(parts: tuple[str], pattern: tuple[str]) -> bool:
+        '''
+        Checks whether a relative path matches a glob pattern. Both are specified as tuples of
+        path segments. Each segment of the pattern matches one segment of the path, except for
+        ** segments, which match any number of segments.
+
+        Parameters:
+            parts                   Segments of the path
+            pattern                 Segments of the glob pattern
+
+        Returns:
+            bool                    True if the path matches the pattern
+        '''
+        if not pattern:
+            return not parts
+
+        if pattern[0] == '**':
+            return any(Discovery.match_pattern(parts[index:], pattern[1:]) for index in range(len(parts) + 1))
+
+        return bool(parts) and fnmatch.fnmatchcase(parts[0], pattern[0]) and \
+            Discovery.match_pattern(parts[1:], pattern[1:])
+
+    def is_selected(parts: tuple[str], pattern: tuple[str]) -> bool:
+        '''
+        Checks whether a file is selected by a manifest pattern. Files are selected when the
+        pattern matches the file itself or one of the directories containing it.
+
+        Parameters:
+            parts                   Segments of the file path relative to the manifest
+            pattern                 Segments of the glob pattern
+
+        Returns:
+            bool                    True if the file is selected by the pattern
+        '''
+        return any(Discovery.match_pattern(parts[:index], pattern) for index in range(1, len(parts) + 1))
+
+    def is_reference(name: str) -> bool:
+        '''
+        Checks whether a file name belongs to a reference file or a reference bundle.
+
+        Parameters:
+            name                    Name of the file
+
+        Returns:
+            bool                    True for .yml files and bundles
+        '''
+        return name.endswith('.yml') or Bundle.is_bundle(Path(name))
+
+    def walk_dir(path: Path, ignore: list[str], manifest: bool = True) -> Iterator[Path]:
+        '''
+        Walks a directory and yields all reference files and bundles in it. Files are yielded
+        before the contents of subdirectories, both in alphabetical order. Directories matching
+        the ignore list and symbolic links to directories are skipped.
+
+        Parameters:
+            path                    Directory to walk
+            ignore                  List of glob patterns for directory names that are skipped
+            manifest                Whether a manifest file in the directory is used
+
+        Returns:
+            Iterator                Iterator over reference files and bundles
+        '''
+        try:
+
+            with os.scandir(path) as iterator:
+                entries = sorted(iterator, key=lambda x: x.name)
+
+        except OSError:
+            return
+
+        if manifest and any(entry.name == Discovery.manifest and entry.is_file() for entry in entries):
+            yield from Discovery.walk_manifest(path.joinpath(Discovery.manifest), ignore)
+            return
+
+        directories = []
+
+        for entry in entries:
+
+            if entry.is_dir(follow_symlinks=False):
+
+                if not Discovery.is_ignored(entry.name, ignore):
+                    directories.append(Path(entry.path))
+
+            elif Discovery.is_reference(entry.name) and entry.is_file():
+                yield Path(entry.path)
+
+        for directory in directories:
+            yield from Discovery.walk_dir(directory, ignore)
+
+    def walk_manifest(manifest: Path, ignore: list[str]) -> Iterator[Path]:
+        '''
+        Yields the reference files and bundles that are selected by a manifest file. The
+        directory of the manifest is walked with the ignore list applied and the patterns
+        are matched against the paths found, so that ignored directories are never entered.
+        Files are yielded in the order of the patterns that select them.
+
+        Parameters:
+            manifest                Path of the manifest file
+            ignore                  List of glob patterns for directory names that are skipped
+
+        Returns:
+            Iterator                Iterator over reference files and bundles
+        '''
+        try:
+            patterns = Discovery.read_manifest(manifest)
+
+        except OSError:
+            return
+
+        root = manifest.parent
+        paths = [(path, path.relative_to(root).parts) for path in Discovery.walk_dir(root, ignore, False)]
+        selected = set()
+
+        for pattern in patterns:
+
+            for path, parts in paths:
+
+                if path not in selected and Discovery.is_selected(parts, pattern):
+                    selected.add(path)
+                    yield path
+
+    def walk(reference_path: Path, ignore: list[str] = None, archive_order: list[str] = None) -> Iterator[Path]:
+        '''
+        Yields all reference files and bundles within the reference path. Archives are walked
+        in order of their precedence. Symbolic links are only followed for the archives in the
+        top level of the reference path.
+
+        Parameters:
+            reference_path          Reference path to walk
+            ignore                  Ignore list to use instead of the configured one
+            archive_order           Archive order to use instead of the configured one
+
+        Returns:
+            Iterator                Iterator over reference files and bundles
+        '''
+        ignore = Discovery.ignore if ignore is None else ignore
+        archive_order = Discovery.archive_order if archive_order is None else archive_order
+
+        try:
+
+            with os.scandir(reference_path) as iterator:
+                entries = sorted(iterator, key=lambda x: Discovery.precedence(x.name, archive_order))
+
+        except OSError:
+            return
+
+        for entry in entries:
+
+            if entry.is_dir():
+
+                if not Discovery.is_ignored(entry.name, ignore):
+                    yield from Discovery.walk_dir(Path(entry.path), ignore)
+
+            elif Discovery.is_reference(entry.name):
+                yield Path(entry.path)
+
+    def find_dirs(root: Path, name: str) -> list[Path]:
+        '''
+        Returns all directories with the specified name below root. The ignore list is applied,
+        except for the name that is searched for.
+
+        Parameters:
+            root                    Directory to search in
+            name                    Name of the directories to look for
+
+        Returns:
+            directories             List of matching directories
+        '''
+        ignore = [pattern for pattern in Discovery.ignore if not fnmatch.fnmatchcase(name, pattern)]
+        directories = []
+        stack = [root]
+
+        while stack:
+
+            path = stack.pop()
+
+            try:
+
+                with os.scandir(path) as iterator:
+                    entries = sorted(iterator, key=lambda x: x.name, reverse=True)
+
+            except OSError:
+                continue
+
+            for entry in entries:
+
+                if not entry.is_dir(follow_symlinks=path == root) or Discovery.is_ignored(entry.name, ignore):
+                    continue
+
+                if entry.name == name:
+                    directories.append(Path(entry.path))
+
+                else:
+                    stack.append(Path(entry.path))
+
+        return sorted(directories)
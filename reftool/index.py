@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import yaml
+import hashlib
+
+from pathlib import Path
+from reftool.note import Note
+from reftool.cache import CacheFile
+
+
+class NoteIndex:
+    '''
+    The NoteIndex class maps the note IDs of a reference to the byte spans of the notes inside
+    the .yml file. Commands that operate on a single note can then read and parse only this
+    note instead of the whole reference. Indexes are stored on disk and are rebuilt when the
+    fingerprint of the reference file changes. Only the indexes of the most recently used
+    references are kept.
+    '''
+    index_path = None
+    max_entries = None
+
+    def initialize(index_path: Path, max_entries: int) -> None:
+        '''
+        Sets the static attributes that are used by the NoteIndex class.
+
+        Parameters:
+            index_path              Directory where note indexes are stored (None disables the index)
+            max_entries             Maximum number of stored note indexes
+
+        Returns:
+            None
+        '''
+        NoteIndex.index_path = index_path
+        NoteIndex.max_entries = max_entries
+
+    def get_entry(path: Path) -> Path:
+        '''
+        Returns the location of the index file for the specified reference.
+
+        Parameters:
+            path                    Path of the reference file
+
+        Returns:
+            entry                   Path of the index file
+        '''
+        digest = hashlib.sha256(str(path.resolve()).encode('utf-8')).hexdigest()
+        return NoteIndex.index_path.joinpath(f'{digest}.json')
+
+    def build(content: bytes) -> dict[str, list[int]]:
+        '''
+        Builds the note index for the specified reference content. Note IDs are assigned in the
+        same way as Item.parse_items and Note.parse_notes do. Each span is verified by parsing
+        it on its own, notes that cannot be parsed in isolation (e.g. because they use YAML
+        anchors) are mapped to None.
+
+        Parameters:
+            content                 Content of the reference file
+
+        Returns:
+            notes                   Dictionary of note ID -> [offset, length, column] or None
+        '''
+        text = content.decode('utf-8')
+        root = yaml.compose(text, Loader=yaml.SafeLoader)
+        yaml_data = yaml.safe_load(text)
+
+        items = NoteIndex.get_value(root, 'Items')
+
+        if not isinstance(items, yaml.SequenceNode) or not isinstance(yaml_data['Items'], list):
+            return None
+
+        notes = {}
+        counter = 1
+        offset = 0
+        byte_offset = 0
+
+        for item_node, item in zip(items.value, yaml_data['Items']):
+
+            notes_node = NoteIndex.get_value(item_node, 'Notes')
+
+            if not isinstance(notes_node, yaml.SequenceNode) or NoteIndex.get_value(item_node, 'Name') is None:
+                return None
+
+            for note_node, note in zip(notes_node.value, item['Notes']):
+
+                if not isinstance(note, dict):
+                    return None
+
+                if 'Text' not in note or 'Comment' not in note:
+                    continue
+
+                start = note_node.start_mark.index
+                end = note_node.end_mark.index
+
+                byte_offset += len(text[offset:start].encode('utf-8'))
+                length = len(text[start:end].encode('utf-8'))
+                offset = start
+
+                span = [byte_offset, length, note_node.start_mark.column]
+
+                if NoteIndex.parse_span(text[start:end], span[2]) != note:
+                    span = None
+
+                notes[str(counter)] = span
+                counter += 1
+
+        return notes
+
+    def get_value(node: yaml.Node, key: str) -> yaml.Node:
+        '''
+        Returns the value node for the specified key inside a mapping node.
+
+        Parameters:
+            node                    Mapping node to look in
+            key                     Key to look for
+
+        Returns:
+            node                    Value node or None
+        '''
+        if not isinstance(node, yaml.MappingNode):
+            return None
+
+        for key_node, value_node in node.value:
+
+            if key_node.value == key:
+                return value_node
+
+        return None
+
+    def parse_span(text: str, column: int) -> dict:
+        '''
+        Parses the YAML representation of a single note.
+
+        Parameters:
+            text                    Text of the note as contained in the reference file
+            column                  Column of the first character of the note
+
+        Returns:
+            note                    Dictionary representation of the note or None
+        '''
+        try:
+            return yaml.safe_load(' ' * column + text)
+
+        except yaml.YAMLError:
+            return None
+
+    def load(path: Path) -> dict[str, list[int]]:
+        '''
+        Returns the note index for the specified reference. The index is read from disk if it
+        matches the fingerprint of the reference file. Otherwise, it is rebuilt and stored and
+        the least recently used indexes are evicted.
+
+        Parameters:
+            path                    Path of the reference file
+
+        Returns:
+            notes                   Dictionary of note ID -> [offset, length, column] or None
+        '''
+        fingerprint = CacheFile.fingerprint(path)
+        entry = NoteIndex.get_entry(path)
+        index = CacheFile.read_json(entry)
+
+        try:
+
+            if index['fingerprint'] == fingerprint:
+                return index['notes']
+
+        except (TypeError, KeyError):
+            pass
+
+        try:
+            notes = NoteIndex.build(path.read_bytes())
+
+        except (yaml.YAMLError, UnicodeDecodeError, KeyError, TypeError):
+            notes = None
+
+        if CacheFile.write_json(entry, {'fingerprint': fingerprint, 'notes': notes}):
+            CacheFile.evict(NoteIndex.index_path, '.json', NoteIndex.max_entries)
+
+        return notes
+
+    def read_span(path: Path, offset: int, length: int) -> bytes:
+        '''
+        Reads the specified byte span from a reference.
+
+        Parameters:
+            path                    Path of the reference file
+            offset                  Offset of the span
+            length                  Length of the span
+
+        Returns:
+            bytes                   Content of the span
+        '''
+        if not isinstance(path, Path):
+            return path.read_bytes()[offset:offset + length]
+
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def load_note(path: Path, number: str) -> tuple[bool, Note]:
+        '''
+        Loads a single note from a reference by using the note index. The first return value
+        indicates whether the index could be used. If it is False, the reference needs to be
+        loaded completely. If it is True, the second return value contains the note or None,
+        if the reference does not contain a note with the specified number.
+
+        Parameters:
+            path                    Path of the reference file
+            number                  Number of the note
+
+        Returns:
+            tuple                   Whether the index was used and the loaded Note object
+        '''
+        if NoteIndex.index_path is None:
+            return (False, None)
+
+        notes = NoteIndex.load(path)
+
+        if notes is None:
+            return (False, None)
+
+        if number not in notes:
+            return (True, None)
+
+        if notes[number] is None:
+            return (False, None)
+
+        offset, length, column = notes[number]
+        text = NoteIndex.read_span(path, offset, length).decode('utf-8')
+
+        note = NoteIndex.parse_span(text, column)
+
+        if not isinstance(note, dict):
+            return (False, None)
+
+        return (True, Note.parse_note(number, note))
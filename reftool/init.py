@@ -6,9 +6,18 @@ import configparser
 from pathlib import Path
 from reftool.item import Item
 from reftool.note import Note
+from reftool.index import NoteIndex
+from reftool.bundle import Bundle
+from reftool.discovery import Discovery
+from reftool.completer import CompleterRegistry, CompleterExecutor
+from reftool.cache import RenderCache, QueryCache
+from reftool.search import Search
 from reftool.reference import Reference
 
 
+default_config = Path(__file__).parent.joinpath('resources/reftool.ini')
+
+
 def expand(path: str, prefix: str) -> Path:
     '''
     Prefix relative paths with the specified prefix, but leave
@@ -29,6 +38,37 @@ def expand(path: str, prefix: str) -> Path:
     return Path(prefix).joinpath(path)
 
 
+def split_list(value: str) -> list[str]:
+    '''
+    Splits a comma separated configuration value into a list of stripped strings.
+
+    Parameters:
+        value               Comma separated configuration value
+
+    Returns:
+        values              List of values
+    '''
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def read_config(user_config: Path = None) -> configparser.ConfigParser:
+    '''
+    Reads the reftool configuration. The default configuration is read first, so that options
+    that are missing in the user configuration fall back to their default values.
+
+    Parameters:
+        user_config         Path to the user configuration (default: ~/.config/reftool.ini)
+
+    Returns:
+        config_parser       ConfigParser containing the configuration
+    '''
+    config_parser = configparser.ConfigParser()
+    user_config = user_config or Path.home().joinpath('.config/reftool.ini')
+
+    config_parser.read([default_config, user_config])
+    return config_parser
+
+
 def reftool_init() -> None:
     '''
     Initializes the reftool module by setting configuration options
@@ -41,16 +81,7 @@ def reftool_init() -> None:
         None
     '''
     user_home = Path.home()
-    module_path = Path(__file__).parent
-    config_parser = configparser.ConfigParser()
-
-    config = module_path.joinpath('resources/reftool.ini')
-    user_config = user_home.joinpath('.config/reftool.ini')
-
-    if user_config.exists():
-        config = user_config
-
-    config_parser.read(config)
+    config_parser = read_config()
 
     reference_config = config_parser["Reference"]
     Reference.initialize(
@@ -59,6 +90,13 @@ def reftool_init() -> None:
         int(reference_config["initial_indent"])
     )
 
+    Search.initialize(float(reference_config["search_timeout"]))
+
+    Discovery.initialize(
+            split_list(reference_config["ignore"]),
+            split_list(reference_config["archive_order"])
+    )
+
     item_config = config_parser["Item"]
     Item.initialize(
             int(item_config["headline_size"]),
@@ -76,3 +114,38 @@ def reftool_init() -> None:
             note_config["comment_color"],
             note_config["parameter_color"]
     )
+
+    cache_config = config_parser["Cache"]
+    cache_path = expand(cache_config["cache_path"], user_home)
+
+    RenderCache.initialize(
+            cache_path.joinpath('render'),
+            int(cache_config["render_entries"])
+    )
+
+    Bundle.initialize(
+            cache_path.joinpath('bundles'),
+            int(cache_config["render_entries"])
+    )
+
+    QueryCache.initialize(
+            cache_path.joinpath('queries.json'),
+            int(cache_config["query_entries"])
+    )
+
+    CompleterRegistry.initialize(
+            Reference.completer_path,
+            cache_path.joinpath('completers.json')
+    )
+
+    completer_config = config_parser["Completer"]
+    CompleterExecutor.initialize(
+            float(completer_config["timeout"]),
+            int(completer_config["max_output"])
+    )
+
+    if cache_config.getboolean("note_index"):
+        NoteIndex.initialize(
+                cache_path.joinpath('index'),
+                int(cache_config["render_entries"])
+        )
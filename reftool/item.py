@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import reftool
 from ttf import Block
 from reftool.note import Note
 
@@ -41,41 +40,60 @@ class Item:
         Item.headline_size = headline_size
         Item.headline_color = headline_color
 
-    def print_item(self, count: int = None) -> None:
+    def get_display() -> dict:
+        '''
+        Returns the display options that are currently configured for the Item and Note classes.
+
+        Parameters:
+            None
+
+        Returns:
+            display         Dictionary of display options
+        '''
+        display = Note.get_display()
+        display['headline_size'] = Item.headline_size
+        display['headline_color'] = Item.headline_color
+
+        return display
+
+    def print_item(self, count: int = None, display: dict = None) -> None:
         '''
         Print the whole Item object. This will print one block row for the headline of the Item
         as well as one block row for each note that is contained inside the item.
 
         Parameters:
             count           The position of the reference within a list
+            display         Display options to use instead of the configured ones
 
         Returns:
             None
         '''
-        offset_block = Block.createEmptyBlock(reftool.reference.Reference.initial_indent)
+        display = display or Item.get_display()
+        offset_block = Block.createEmptyBlock(display['initial_indent'])
 
         headline_padding = [1, 0, 0, 0]
 
         if count is not None and count == 0:
             headline_padding[0] = 0
 
-        headline_head = [self.title, Item.headline_color, False]
+        headline_head = [self.title, display['headline_color'], False]
         headline_body = ['', 'none', 0]
-        headline_block = Block(Item.headline_size, headline_padding, headline_head, headline_body)
+        headline_block = Block(display['headline_size'], headline_padding, headline_head, headline_body)
 
         offset_block.right = headline_block
         offset_block.buildBlockChain()
         offset_block.printBlockChain()
 
         for note in self.notes:
-            note.print_note()
+            note.print_note(display)
 
-    def print_items(item_list: list[Item]) -> None:
+    def print_items(item_list: list[Item], display: dict = None) -> None:
         '''
         Helper function that can be used to print a list of Items.
 
         Parameters:
             item_list       List of items to print
+            display         Display options to use instead of the configured ones
 
         Returns:
             None
@@ -83,7 +101,7 @@ class Item:
         ctr = 0
 
         for item in item_list:
-            item.print_item(ctr)
+            item.print_item(ctr, display)
             ctr += 1
 
     def parse_items(items: list[dict]) -> list[Item]:
@@ -96,20 +114,26 @@ class Item:
         Returns:
             item_list       List of parsed Item objects
         '''
-        item_list = []
-
         try:
-
-            for item in items:
-                notes = Note.parse_notes(item['Notes'])
-                new_item = Item(item['Name'], notes)
-                item_list.append(new_item)
+            return [Item.parse_item(item) for item in items]
 
         except KeyError as e:
             print(f'[-] Error: Found reference without a {e} section.')
-            return []
 
-        return item_list
+        return []
+
+    def parse_item(item: dict) -> Item:
+        '''
+        Parses an Item object represented as dictionary object. Raises KeyError if the dictionary
+        does not contain a Name or Notes section.
+
+        Parameters:
+            item            Dictionary object representing an Item
+
+        Returns:
+            item            Parsed Item object
+        '''
+        return Item(item['Name'], Note.parse_notes(item['Notes']))
 
     def get_note(self, number: int) -> Note:
         '''
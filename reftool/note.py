@@ -1,15 +1,17 @@
 from __future__ import annotations
 
-import os
 import re
 import html
 import json
 import base64
 import reftool
+import functools
 import pyperclip
-import subprocess
 
 from ttf import Block
+from pathlib import Path
+from typing import Callable
+from reftool.completer import CompleterExecutor
 from urllib.parse import quote_plus
 
 
@@ -78,35 +80,59 @@ class Note:
         Note.text_size = text_size
         Note.text_color = text_color
         Note.count_color = count_color
-        Note.count_padding = count_padding + 3
+        Note.count_padding = count_padding
         Note.count_indent = count_indent
         Note.comment_size = comment_size
         Note.comment_color = comment_color
         Note.parameter_color = parameter_color
 
-    def print_note(self) -> None:
+    def get_display() -> dict:
         '''
-        Just prints one block row which consits of padding + number + text + comment
+        Returns the display options that are currently configured for the Note class.
 
         Parameters:
             None
 
+        Returns:
+            display                          Dictionary of display options
+        '''
+        return {
+            'initial_indent': reftool.reference.Reference.initial_indent,
+            'text_size': Note.text_size,
+            'text_color': Note.text_color,
+            'count_color': Note.count_color,
+            'count_padding': Note.count_padding,
+            'count_indent': Note.count_indent,
+            'comment_size': Note.comment_size,
+            'comment_color': Note.comment_color,
+            'parameter_color': Note.parameter_color,
+        }
+
+    def print_note(self, display: dict = None) -> None:
+        '''
+        Just prints one block row which consits of padding + number + text + comment
+
+        Parameters:
+            display              Display options to use instead of the configured ones
+
         Returns:
             None
         '''
-        offset_block = Block.createEmptyBlock(reftool.reference.Reference.initial_indent)
-        text = self.reduce()
+        display = display or Note.get_display()
 
-        text_padding = [0, 0, 0, Note.count_indent]
-        text_head = [self.number + ')', Note.count_color, False]
-        text_body = [text, Note.text_color, Note.count_padding]
-        text_block = Block(Note.text_size, text_padding, text_head, text_body)
-        text_block.addKeyword('<[A-Z0-9]+>', Note.parameter_color)
+        offset_block = Block.createEmptyBlock(display['initial_indent'])
+        text = self.reduce(display['text_size'])
+
+        text_padding = [0, 0, 0, display['count_indent']]
+        text_head = [self.number + ')', display['count_color'], False]
+        text_body = [text, display['text_color'], display['count_padding'] + 3]
+        text_block = Block(display['text_size'], text_padding, text_head, text_body)
+        text_block.addKeyword('<[A-Z0-9]+>', display['parameter_color'])
 
         comment_padding = [0, 0, 0, 5]
-        comment_head = ['#', Note.comment_color, False]
-        comment_body = [self.comment, Note.comment_color, 2]
-        comment_block = Block(Note.comment_size, comment_padding, comment_head, comment_body)
+        comment_head = ['#', display['comment_color'], False]
+        comment_body = [self.comment, display['comment_color'], 2]
+        comment_block = Block(display['comment_size'], comment_padding, comment_head, comment_body)
 
         offset_block.right = text_block
         text_block.right = comment_block
@@ -125,6 +151,20 @@ class Note:
         Returns:
             None
         '''
+        pyperclip.copy(self.expand(arguments, encoding))
+
+    def expand(self, arguments: list[str], encoding: str = None) -> str:
+        '''
+        Replaces all keywords inside the text attribute of a Note by the corresponding
+        matches from the argument array and applies the selected encoding.
+
+        Parameters:
+            arguments               List of key=value pairs
+            encoding                encoding to apply after the replacement
+
+        Returns:
+            text                    Expanded text of the Note
+        '''
         for argument in arguments:
 
             key, value = argument.split('=', 1)
@@ -133,7 +173,7 @@ class Note:
         if encoding is not None:
             self.apply_encoding(encoding)
 
-        pyperclip.copy(self.text)
+        return self.text
 
     def apply_encoding(self, encoding: str) -> None:
         '''
@@ -205,17 +245,18 @@ class Note:
         for arg in set(self.get_args()):
             print(arg.lower())
 
-    def get_completion(self, param: str) -> list[str]:
+    def get_completer(self, param: str, completer_path: Path = None) -> Callable:
         '''
-        Returns a list of possible completions for a certain parameter
+        Returns a callable that computes the possible completions for a certain parameter.
 
         Parameters:
             param               Name of the parameter to complete
+            completer_path      Completer path to use instead of the configured one
 
         Returns:
-            list                List of possible completions
+            completer           Callable without arguments that returns a list of completions
         '''
-        default = ['[FILE]']
+        default = functools.partial(list, CompleterExecutor.default)
 
         if self.autocomplete is None or param not in self.autocomplete:
             return default
@@ -225,28 +266,51 @@ class Note:
         try:
 
             if comp['type'] == 'list':
-                return comp['completer']
+                return functools.partial(list, comp['completer'])
 
             if comp['type'] == 'IP':
-                return ['[IP]']
+                return functools.partial(list, ['[IP]'])
 
             if comp['type'] == 'script' and comp['completer'].endswith('.sh'):
+                return functools.partial(CompleterExecutor.run_script, comp['completer'], completer_path)
 
-                completer_path = reftool.reference.Reference.completer_path
-                for completer_folder in completer_path.glob('**/completers'):
-
-                    script = completer_folder.joinpath(comp['completer'])
-                    if script.is_file() and os.access(script, os.X_OK) and completer_path in script.parents:
-                        output = subprocess.check_output([script])
-                        output = output.decode('utf-8')
-                        output = list(filter(None, output.split('\n')))
-                        return output
+            if comp['type'] == 'python':
+                return functools.partial(CompleterExecutor.run_python, comp['completer'], param, completer_path)
 
         except KeyError:
             pass
 
         return default
 
+    def get_completion(self, param: str, completer_path: Path = None) -> list[str]:
+        '''
+        Returns a list of possible completions for a certain parameter
+
+        Parameters:
+            param               Name of the parameter to complete
+            completer_path      Completer path to use instead of the configured one
+
+        Returns:
+            list                List of possible completions
+        '''
+        return CompleterExecutor.complete({param: self.get_completer(param, completer_path)})[param]
+
+    def get_completions(self, completer_path: Path = None) -> dict[str, list[str]]:
+        '''
+        Returns the possible completions for all parameters of the note. The completers
+        of the different parameters are run concurrently.
+
+        Parameters:
+            completer_path      Completer path to use instead of the configured one
+
+        Returns:
+            dict                Dictionary of parameter name -> list of possible completions
+        '''
+        params = dict.fromkeys(map(lambda x: x.lower(), self.get_args()))
+        completers = {param: self.get_completer(param, completer_path) for param in params}
+
+        return CompleterExecutor.complete(completers)
+
     def print_completion(self, param: str) -> None:
         '''
         Prints a list of possible completions for the specified parameter.
@@ -262,6 +326,44 @@ class Note:
         for completion in completions:
             print(completion)
 
+    def print_completions(self) -> None:
+        '''
+        Prints the possible completions for all parameters of the note. Each completion
+        is printed as param=completion.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        '''
+        for param, completions in self.get_completions().items():
+
+            for completion in completions:
+                print(f'{param}={completion}')
+
+    def parse_note(number: str, note: dict) -> Note:
+        '''
+        Parses a Note object from a dictionary object. Raises KeyError if the dictionary
+        does not contain a Text or Comment section.
+
+        Parameters:
+            number              String representation of the Note-ID
+            note                Dictionary object describing the Note
+
+        Returns:
+            note                New created Note object
+        '''
+        new_note = Note(number, note['Text'], note['Comment'])
+
+        if 'Autocomplete' in note:
+            new_note.autocomplete = note['Autocomplete']
+
+        new_note.truncate = note.get('Truncate', False)
+        new_note.lines = note.get('Lines')
+
+        return new_note
+
     def parse_notes(notes: list[dict]) -> list[Note]:
         '''
         Parses a list of Note objects from a list of dictionary objects.
@@ -277,21 +379,14 @@ class Note:
         for note in notes:
 
             try:
-                new_note = Note(str(Note.note_count), note['Text'], note['Comment'])
-
-                if 'Autocomplete' in note:
-                    new_note.autocomplete = note['Autocomplete']
-
-                new_note.truncate = note.get('Truncate', False)
-                new_note.lines = note.get('Lines')
-                note_list.append(new_note)
+                note_list.append(Note.parse_note(str(Note.note_count), note))
 
             except KeyError:
                 continue
 
         return note_list
 
-    def reduce(self):
+    def reduce(self, text_size: int = None):
         '''
         Reduce the content of the Note to better fit into the display. The
         detailed action depends on the 'Lines' and 'Truncate' parameters within
@@ -300,11 +395,12 @@ class Note:
         width are truncated.
 
         Parameters:
-            None
+            text_size       Text size to use instead of the configured one
 
         Returns:
             reduced         Note with reduced content
         '''
+        text_size = text_size or Note.text_size
         truncated = False
         lines = self.text.split('\n')
 
@@ -315,8 +411,8 @@ class Note:
         if self.truncate:
 
             for ctr in range(len(lines)):
-                if len(lines[ctr]) >= Note.text_size:
-                    lines[ctr] = lines[ctr][0:Note.text_size - 15] + '[...]'
+                if len(lines[ctr]) >= text_size:
+                    lines[ctr] = lines[ctr][0:text_size - 15] + '[...]'
                     truncated = True
 
         if truncated:
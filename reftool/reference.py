@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import io
 import os
 import re
 import sys
 import yaml
+import tarfile
+import zipfile
+import contextlib
 
 from pathlib import Path
 from reftool.note import Note
 from reftool.item import Item
+from reftool.index import NoteIndex
+from reftool.bundle import Bundle
+from reftool.discovery import Discovery
+from reftool.search import Search
+from reftool.cache import RenderCache, QueryCache
 from ttf import coloredWrapper
 
 
@@ -50,30 +59,69 @@ class Reference:
         Reference.completer_path = completer_path
         Reference.initial_indent = initial_indent
 
-    def print(self) -> None:
+    def print(self, display: dict = None) -> None:
         '''
         Prints formatted output of all items inside this reference.
 
         Parameters:
-            None
+            display                 Display options to use instead of the configured ones
 
         Returns:
             None
         '''
-        Item.print_items(self.items)
+        Item.print_items(self.items, display)
+
+    def open_bundle(path: Path, quiet: bool = False) -> Bundle:
+        '''
+        Opens a reference bundle and prints an error if the bundle cannot be read.
+
+        Parameters:
+            path                    Path of the bundle file
+            quiet                   Skip unreadable bundles without printing an error
+
+        Returns:
+            Bundle                  Bundle object or None
+        '''
+        try:
+            return Bundle.open(path)
 
-    def get_references() -> list[Path]:
+        except (OSError, zipfile.BadZipFile, tarfile.TarError):
+
+            if not quiet:
+                print(f'[-] Error: Unable to read reference bundle {path}')
+
+        return None
+
+    def get_references(reference_path: Path = None, ignore: list[str] = None, archive_order: list[str] = None,
+                       quiet: bool = False) -> list[Path]:
         '''
         Returns a list of Path objects, one for each reference found within the configured
-        reference path.
+        reference path. References contained in bundles are returned as BundleEntry objects.
+        References are ordered by the precedence of their archives.
 
         Parameters:
-            None
+            reference_path          Reference path to use instead of the configured one
+            ignore                  Ignore list to use instead of the configured one
+            archive_order           Archive order to use instead of the configured one
+            quiet                   Skip unreadable bundles without printing an error
 
         Returns:
             list                    List of Path objects, one for each reference
         '''
-        return Reference.reference_path.glob('**/*.yml')
+        references = []
+
+        for path in Discovery.walk(reference_path or Reference.reference_path, ignore, archive_order):
+
+            if path.suffix == '.yml':
+                references.append(path)
+                continue
+
+            bundle = Reference.open_bundle(path, quiet)
+
+            if bundle is not None:
+                references += bundle.entries()
+
+        return references
 
     def list_references(expression: str = '') -> list[str]:
         '''
@@ -104,35 +152,60 @@ class Reference:
         for reference in Reference.list_references(expression):
             print(reference)
 
-    def search_references(expression: str) -> list[str]:
+    def search_references(expression: str | list[str], match_all: bool = False) -> list[str]:
         '''
         Search the contents of all references for an expression and return a list of strings,
-        containing the matching reference names.
+        containing the matching reference names. When a list of expressions is specified, each
+        of them is treated as a literal search term.
 
         Parameters:
-            expression              Expression to look for
+            expression              Expression or list of terms to look for
+            match_all               Whether all terms need to match (default: any term)
 
         Returns:
             matches                 All references that contain the specified expression
         '''
-        matches = []
+        if isinstance(expression, str):
+            expression = [expression]
+
+        mode = 'search-all' if match_all else 'search-any'
+        paths = Reference.get_references()
+        matches = QueryCache.load(mode, expression, paths)
+
+        if matches is not None:
+            return matches
+
+        skipped = []
 
         try:
-            regex = re.compile(expression)
+            matches = Search.search(paths, expression, match_all, skipped)
 
         except re.error:
             print("[-] Error: Invalid regular expression syntax!")
             return []
 
-        for reference in Reference.get_references():
-
-            content = reference.read_text()
+        matches = list(map(lambda x: x.stem, matches))
+        Reference.print_skipped(skipped)
 
-            if regex.search(content):
-                matches.append(reference.stem)
+        if not skipped:
+            QueryCache.store(mode, expression, matches, paths)
 
         return matches
 
+    def print_skipped(skipped: list[Path]) -> None:
+        '''
+        Prints a warning for each reference that was skipped by a search, because the search
+        exceeded its time budget.
+
+        Parameters:
+            skipped                 List of skipped references
+
+        Returns:
+            None
+        '''
+        for path in skipped:
+            print(f'[-] Warning: Search in {path} exceeded the time budget of {Search.timeout}s and was skipped.')
+
     def pretty_print_list(headline: str, value_list: str) -> None:
         '''
         Helper function to print the returned lists by search_references.
@@ -153,33 +226,140 @@ class Reference:
         for value in values:
             print(f'{prefix}  {value}')
 
-    def load_reference(name: str) -> Reference:
+    def find_reference(name: str, reference_path: Path = None, ignore: list[str] = None,
+                       archive_order: list[str] = None, quiet: bool = False) -> Path:
+        '''
+        Returns the path of the .yml file for the reference with the specified name. When
+        several archives contain a reference with this name, the one from the archive with
+        the highest precedence is returned.
+
+        Parameters:
+            name                    Name of the reference to look for
+            reference_path          Reference path to use instead of the configured one
+            ignore                  Ignore list to use instead of the configured one
+            archive_order           Archive order to use instead of the configured one
+            quiet                   Skip unreadable bundles without printing an error
+
+        Returns:
+            Path                    Path of the reference file or None
+        '''
+        for path in Discovery.walk(reference_path or Reference.reference_path, ignore, archive_order):
+
+            if path.suffix == '.yml':
+
+                if path.stem == name:
+                    return path
+
+                continue
+
+            bundle = Reference.open_bundle(path, quiet)
+
+            if bundle is not None and bundle.find(name) is not None:
+                return bundle.find(name)
+
+        return None
+
+    def load_reference(name: str, path: Path = None) -> Reference:
         '''
         Creates a new Reference object from a .yml file.
 
         Parameters:
             name                    Name of the reference that should be loaded.
+            path                    Path of the .yml file (looked up by name if not specified)
 
         Returns:
             Reference               New created reference object.
         '''
+        ref = path or Reference.find_reference(name)
+
+        if ref is None:
+            print(f"[-] Error: Cannot find reference with name: {name}")
+            return None
+
         try:
-            ref = next(Reference.reference_path.glob(f'**/{name}.yml'))
 
-            with open(ref, "r") as file:
+            with ref.open("r") as file:
                 yaml_data = yaml.safe_load(file)
 
             item_list = Item.parse_items(yaml_data['Items'])
             return Reference(name, item_list)
 
-        except StopIteration:
-            print(f"[-] Error: Cannot find reference with name: {name}")
-
         except KeyError:
             print(f'[-] Error: Reference {name} does not contain an Items section.')
 
         return None
 
+    def print_reference(name: str) -> None:
+        '''
+        Prints the reference with the specified name. The rendered output is taken from
+        the render cache if possible. Otherwise, the reference is rendered and the output
+        is stored in the cache.
+
+        Parameters:
+            name                    Name of the reference that should be printed
+
+        Returns:
+            None
+        '''
+        path = Reference.find_reference(name)
+
+        if path is None:
+            print(f"[-] Error: Cannot find reference with name: {name}")
+            return
+
+        output = RenderCache.load(path)
+
+        if output is None:
+
+            reference = Reference.load_reference(name, path)
+
+            if reference is None:
+                return
+
+            with contextlib.redirect_stdout(io.StringIO()) as buffer:
+                reference.print()
+
+            output = buffer.getvalue()
+
+            if reference.items:
+                RenderCache.store(path, output)
+
+        sys.stdout.write(output)
+
+    def load_note(name: str, number: str) -> Note:
+        '''
+        Loads a single note from the reference with the specified name. If possible, the note
+        index is used to parse only the requested note. Otherwise, the whole reference is loaded.
+
+        Parameters:
+            name                    Name of the reference
+            number                  Number of the note
+
+        Returns:
+            note                    Note object or None
+        '''
+        path = Reference.find_reference(name)
+
+        if path is None:
+            print(f"[-] Error: Cannot find reference with name: {name}")
+            return None
+
+        indexed, note = NoteIndex.load_note(path, number)
+
+        if not indexed:
+
+            reference = Reference.load_reference(name, path)
+
+            if reference is None:
+                return None
+
+            return reference.get_note(number)
+
+        if note is None:
+            print(f'[-] Error: Unable to find note with ID {number} in reference {name}')
+
+        return note
+
     def get_note(self, number):
         '''
         Returns the Note object that is related to the number given as argument.
@@ -224,55 +404,126 @@ class Reference:
 
         return joined_ref
 
-    def create_matching_reference(expression: str) -> Reference:
+    def search_notes(expression: str) -> Reference:
         '''
-        Finds all references that contain a particular expression and joins them
-        together into a single reference.
+        Finds all notes that match a particular expression and joins them together into a
+        single reference. The matching notes of each reference are stored in the query cache,
+        keyed by the path of the reference, so that repeated searches only need to load the
+        matching references.
 
         Parameters:
             expression              Expression to look for
 
         Returns:
-            joined_ref              Joined Reference object
+            joined_ref              Joined Reference object containing the matching notes
         '''
-        references = Reference.search_references(expression)
-        references = list(map(lambda x: Reference.load_reference(x), references))
+        try:
+            regex = re.compile(expression)
+
+        except re.error:
+            print("[-] Error: Invalid regular expression syntax!")
+            return Reference('JoinedRef', [])
+
+        paths = {str(path): path for path in Reference.get_references()}
+        hits = QueryCache.load('reference-search', [expression], list(paths.values()))
+        parsed = {}
+
+        if hits is None:
+
+            hits = {}
+            skipped = []
+
+            for path in Search.search(list(paths.values()), [expression], skipped=skipped):
+
+                reference = Reference.load_reference(path.stem, path)
+
+                if reference is not None:
+                    hits[str(path)] = reference.find_notes(regex)
+                    parsed[str(path)] = reference
+
+            Reference.print_skipped(skipped)
+
+            if not skipped:
+                QueryCache.store('reference-search', [expression], hits, list(paths.values()))
+
+        references = []
+
+        for key, positions in hits.items():
+
+            reference = parsed.get(key)
+
+            if reference is None and key in paths:
+                reference = Reference.load_reference(paths[key].stem, paths[key])
+
+            if reference is not None:
+                reference.select_notes(positions)
+                references.append(reference)
+
         joined_ref = Reference.join_references(references)
+        joined_ref.renumber()
+
         return joined_ref
 
-    def filter_reference(self, expression: str) -> None:
+    def find_notes(self, regex: re.Pattern) -> list[int]:
         '''
-        Removes all Notes from a reference object, that do not match the specified
-        expression.
+        Returns the positions of all notes within the reference that match the specified regex.
+        Positions are counted over all notes of the reference, starting at zero.
 
         Parameters:
-            expression              Expression to exclude
+            regex                   Compiled regular expression
 
         Returns:
-            None
+            positions               List of positions of matching notes
         '''
-        try:
-            regex = re.compile(expression)
+        notes = [note for item in self.items for note in item.notes]
+        return [position for position, note in enumerate(notes) if regex.search(note.text)]
 
-        except re.error:
-            print("[-] Error: Invalid regular expression syntax!")
-            return
+    def select_notes(self, positions: list[int]) -> None:
+        '''
+        Removes all Notes from a reference object, that are not located at the specified
+        positions. Items that do not contain any notes afterwards are removed as well.
+
+        Parameters:
+            positions               Positions of the notes to keep (as returned by find_notes)
 
+        Returns:
+            None
+        '''
+        positions = set(positions)
         items = []
-        counter = 1
+        position = 0
 
         for item in self.items:
 
             notes = []
+
             for note in item.notes:
 
-                if regex.search(note.text):
-                    note.number = str(counter)
+                if position in positions:
                     notes.append(note)
-                    counter += 1
+
+                position += 1
 
             if notes:
                 item.notes = notes
                 items.append(item)
 
         self.items = items
+
+    def renumber(self) -> None:
+        '''
+        Assigns consecutive numbers to all notes within the reference, starting at one.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        '''
+        counter = 1
+
+        for item in self.items:
+
+            for note in item.notes:
+                note.number = str(counter)
+                counter += 1
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import re
+import multiprocessing
+
+from pathlib import Path
+from collections import deque
+
+
+class AhoCorasick:
+    '''
+    Aho-Corasick automaton that finds occurrences of several literal patterns within a
+    single pass over the input. The automaton operates on bytes, which allows searching
+    reference files without decoding them.
+    '''
+
+    def __init__(self, patterns: list[bytes]) -> None:
+        '''
+        Builds the automaton for the specified patterns.
+
+        Parameters:
+            patterns            List of literal patterns to look for
+
+        Returns:
+            None
+        '''
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+
+        for pattern in patterns:
+
+            state = 0
+
+            for byte in pattern:
+
+                if byte not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][byte] = len(self.goto) - 1
+
+                state = self.goto[state][byte]
+
+            self.output[state].add(pattern)
+
+        queue = deque(self.goto[0].values())
+
+        while queue:
+
+            state = queue.popleft()
+
+            for byte, next_state in self.goto[state].items():
+
+                queue.append(next_state)
+                fail = self.fail[state]
+
+                while fail and byte not in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                self.fail[next_state] = self.goto[fail].get(byte, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def find(self, data: bytes, stop: int = None) -> set[bytes]:
+        '''
+        Returns the set of patterns that occur within data.
+
+        Parameters:
+            data                Data to search in
+            stop                Stop searching once this number of different patterns was found
+
+        Returns:
+            found               Set of patterns found within data
+        '''
+        found = set()
+        state = 0
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+
+        for byte in data:
+
+            while state and byte not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(byte, 0)
+
+            if output[state]:
+
+                found |= output[state]
+
+                if stop is not None and len(found) >= stop:
+                    break
+
+        return found
+
+
+class RegexWorker:
+    '''
+    Runs regular expression searches inside a separate process. Python's regex engine cannot
+    be interrupted, so a catastrophically backtracking expression would block reftool forever.
+    Running the search in a worker process allows to terminate it once the time budget for a
+    file is exceeded.
+    '''
+
+    def __init__(self, expression: str) -> None:
+        '''
+        Creates a new RegexWorker for the specified expression. The worker process is started
+        on the first search.
+
+        Parameters:
+            expression          Regular expression to search for
+
+        Returns:
+            None
+        '''
+        self.expression = expression
+        self.process = None
+        self.connection = None
+
+    def serve(expression: str, connection) -> None:
+        '''
+        Main loop of the worker process. Receives reference paths and responds with whether the
+        reference content matches the expression.
+
+        Parameters:
+            expression          Regular expression to search for
+            connection          Connection to the parent process
+
+        Returns:
+            None
+        '''
+        regex = re.compile(expression)
+
+        while True:
+
+            path = connection.recv()
+
+            try:
+                connection.send(regex.search(path.read_text()) is not None)
+
+            except (OSError, UnicodeDecodeError):
+                connection.send(False)
+
+    def start(self) -> None:
+        '''
+        Starts the worker process.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        '''
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=RegexWorker.serve, args=(self.expression, child), daemon=True)
+        self.process.start()
+
+    def stop(self) -> None:
+        '''
+        Stops the worker process.
+
+        Parameters:
+            None
+
+        Returns:
+            None
+        '''
+        if self.process is None:
+            return
+
+        if self.process.is_alive():
+            self.process.kill()
+
+        self.process.join()
+        self.connection.close()
+        self.process = None
+
+    def search(self, path: Path, timeout: float) -> bool:
+        '''
+        Searches the specified file for the expression. If the search exceeds the specified
+        timeout, the worker process is killed and None is returned.
+
+        Parameters:
+            path                Path of the file to search in
+            timeout             Time budget for the search in seconds
+
+        Returns:
+            bool                Whether the file matches or None on timeout
+        '''
+        if self.process is None:
+            self.start()
+
+        self.connection.send(path)
+
+        if self.connection.poll(timeout):
+            return self.connection.recv()
+
+        self.stop()
+        return None
+
+
+class Search:
+    '''
+    The Search class implements the content search over reference files. Single expressions
+    that do not contain regex syntax and multi term searches are performed as literal searches.
+    Regular expressions are evaluated with a time budget per file.
+    '''
+    timeout = 1.0
+    automaton_threshold = 16
+    regex_chars = set('.^$*+?{}[]\\|()')
+
+    def initialize(timeout: float) -> None:
+        '''
+        Sets the static attributes that are used by the Search class.
+
+        Parameters:
+            timeout             Time budget per file for regex searches in seconds (0 disables the budget)
+
+        Returns:
+            None
+        '''
+        Search.timeout = timeout
+
+    def is_literal(expression: str) -> bool:
+        '''
+        Checks whether an expression contains regex syntax.
+
+        Parameters:
+            expression          Expression to check
+
+        Returns:
+            bool                True if the expression can be searched literally
+        '''
+        return not Search.regex_chars.intersection(expression)
+
+    def matcher(terms: list[str], match_all: bool = False):
+        '''
+        Creates a function that checks whether some data contains the specified literal terms.
+        For large term sets, an Aho-Corasick automaton is used that matches all terms in a single
+        pass. Small term sets are matched term by term, as the byte search of the interpreter
+        outperforms a Python level automaton in this case.
+
+        Parameters:
+            terms               List of literal terms
+            match_all           Whether all terms need to match (default: any term)
+
+        Returns:
+            function            Function that takes bytes and returns a bool
+        '''
+        patterns = list(dict.fromkeys(map(lambda x: x.encode('utf-8'), terms)))
+
+        if len(patterns) > Search.automaton_threshold:
+
+            automaton = AhoCorasick(patterns)
+            stop = len(patterns) if match_all else 1
+
+            return lambda data: len(automaton.find(data, stop)) >= stop
+
+        if match_all:
+            return lambda data: all(pattern in data for pattern in patterns)
+
+        return lambda data: any(pattern in data for pattern in patterns)
+
+    def search(paths: list[Path], terms: list[str], match_all: bool = False, skipped: list[Path] = None,
+               timeout: float = None) -> list[Path]:
+        '''
+        Searches the specified files and returns the ones that match. Multiple terms are treated
+        as literals. A single term is treated as regular expression, unless it does not contain
+        regex syntax. Files that exceed the time budget are not reported as matches, but added
+        to the skipped list. Raises re.error for invalid expressions.
+
+        Parameters:
+            paths               Files to search in
+            terms               List of search terms
+            match_all           Whether all terms need to match (default: any term)
+            skipped             List where files that exceeded the time budget are appended to
+            timeout             Time budget to use instead of the configured one
+
+        Returns:
+            matches             List of matching files
+        '''
+        if len(terms) > 1 or Search.is_literal(terms[0]):
+            matcher = Search.matcher(terms, match_all)
+            return [path for path in paths if matcher(path.read_bytes())]
+
+        regex = re.compile(terms[0])
+        timeout = Search.timeout if timeout is None else timeout
+
+        if not timeout:
+            return [path for path in paths if regex.search(path.read_text())]
+
+        matches = []
+        worker = RegexWorker(terms[0])
+
+        try:
+
+            for path in paths:
+
+                result = worker.search(path, timeout)
+
+                if result is None and skipped is not None:
+                    skipped.append(path)
+
+                elif result:
+                    matches.append(path)
+
+        finally:
+            worker.stop()
+
+        return matches